@@ -1,3 +1,7 @@
+from __future__ import annotations
+
+from .graphagent.bm25 import BM25Index
+
 DOCS = [
     "Xeriscape (drought-tolerant) designs rely on native/adapted plants, mulch, and efficient drip irrigation; water use can drop 30–60% vs. traditional turf.",
     "Traditional lawn-centric front yards emphasize uniform turf; aesthetics are formal/green but require frequent mowing, fertilization, and irrigation.",
@@ -6,8 +10,24 @@ DOCS = [
     "Inputs comparison: turf lawns usually require regular irrigation (1–1.5 inches/week in summer), N-rich fertilizer 2–4×/season, and pest control; xeriscape reduces irrigation frequency and fertilizer needs.",
 ]
 
-def search_docs(q: str, k: int = 3) -> list[str]:
-    ql = q.lower()
-    scored = sorted(DOCS, key=lambda d: -sum(w in d.lower() for w in ql.split()))
-    return scored[:k]
+_INDEX: BM25Index | None = None
 
+def _index() -> BM25Index:
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = BM25Index()
+        _INDEX.add_many(enumerate(DOCS))
+    return _INDEX
+
+def add_doc(text: str) -> int:
+    """Append a document and index it incrementally; returns its position in DOCS."""
+    DOCS.append(text)
+    _index().add(len(DOCS) - 1, text)
+    return len(DOCS) - 1
+
+def search_docs(q: str, k: int = 3) -> list[str]:
+    """BM25 top-k; padded with unmatched docs in DOCS order so k results come back as before."""
+    hits = [i for i, _ in _index().search(q, k)]
+    if len(hits) < k:
+        hits += [i for i in range(len(DOCS)) if i not in hits][: k - len(hits)]
+    return [DOCS[i] for i in hits]
@@ -0,0 +1,280 @@
+# app/graphagent/ann_index.py
+# Approximate nearest-neighbour recall over an mmap_store export (CPU only).
+#   ivf  - spherical k-means coarse quantizer + inverted lists, pure NumPy; candidates
+#          from the nprobe closest lists are rescored exactly against the vectors.
+#   hnsw - faiss.IndexHNSWFlat (inner product), when faiss-cpu is installed.
+# Files live next to the export (<db_dir>/_mmap/<collection>@<version>/ann.*) so row numbers match;
+# build parameters and a recall-vs-latency report go into _collections/<name>.json ("ann").
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .config import RAG_DB_DIR, RAG_ANN, RAG_ANN_MIN_ROWS, RAG_ANN_TARGET_RECALL
+
+try:
+    import faiss  # optional
+except Exception:
+    faiss = None
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the k highest scores, best first (argpartition + sort of the k)."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def as_f32(block: np.ndarray) -> np.ndarray:
+    return block if block.dtype == np.float32 else block.astype(np.float32)
+
+
+def dense_scores(emb: np.ndarray, q: np.ndarray, block: int = 65536) -> np.ndarray:
+    """emb @ q in float32, block by block (keeps float16 memmaps from being upcast whole)."""
+    if emb.dtype == np.float32:
+        return emb @ q
+    out = np.empty(emb.shape[0], dtype=np.float32)
+    for s in range(0, emb.shape[0], block):
+        out[s:s + block] = emb[s:s + block].astype(np.float32) @ q
+    return out
+
+
+# --- IVF (NumPy) ---
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, nprobe: int = 8):
+        self.centroids = centroids   # (nlist, dim) float32, unit norm
+        self.order = order           # row ids grouped by list
+        self.offsets = offsets       # (nlist + 1,) list boundaries into order
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int | None = None, iters: int = 10,
+              sample: int = 50000, seed: int = 0, block: int = 65536) -> Tuple["IVFIndex", Dict[str, Any]]:
+        n = vectors.shape[0]
+        nlist = nlist or max(1, int(4 * math.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        train = as_f32(vectors[np.sort(rng.choice(n, size=min(n, max(sample, nlist)), replace=False))])
+        nlist = min(nlist, train.shape[0])  # a small collection can't seed more lists than it has rows
+        cent = train[rng.choice(train.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(train @ cent.T, axis=1)
+            sums = np.zeros_like(cent)
+            np.add.at(sums, assign, train)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():  # reseed empty lists from random training points
+                sums[empty] = train[rng.choice(train.shape[0], size=int(empty.sum()), replace=False)]
+            cent = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        cent = cent.astype(np.float32)
+
+        assign = np.empty(n, dtype=np.int32)
+        for s in range(0, n, block):
+            assign[s:s + block] = np.argmax(as_f32(vectors[s:s + block]) @ cent.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        return cls(cent, order, offsets), {"nlist": nlist, "iters": iters, "sample": int(train.shape[0]), "seed": seed}
+
+    def search(self, vectors: np.ndarray, q: np.ndarray, k: int, nprobe: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        lists = top_k(self.centroids @ q, nprobe or self.nprobe)
+        cand = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]) if len(lists) else np.zeros(0, np.int64)
+        cand.sort()  # sequential access into the memmap
+        scores = as_f32(vectors[cand]) @ q
+        top = top_k(scores, k)
+        return cand[top], scores[top]
+
+    def save(self, d: str) -> None:
+        np.save(os.path.join(d, "ann.ivf_centroids.npy"), self.centroids)
+        np.save(os.path.join(d, "ann.ivf_order.npy"), self.order)
+        np.save(os.path.join(d, "ann.ivf_offsets.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, d: str, nprobe: int) -> "IVFIndex":
+        return cls(np.load(os.path.join(d, "ann.ivf_centroids.npy")),
+                   np.load(os.path.join(d, "ann.ivf_order.npy"), mmap_mode="r"),
+                   np.load(os.path.join(d, "ann.ivf_offsets.npy")), nprobe=nprobe)
+
+    def settings(self) -> List[Dict[str, int]]:
+        nlist = self.centroids.shape[0]
+        return [{"nprobe": p} for p in sorted({1, 2, 4, 8, 16, 32, 64}) if p <= nlist]
+
+    def apply(self, setting: Dict[str, int]) -> None:
+        self.nprobe = setting["nprobe"]
+
+
+# --- HNSW (faiss) ---
+class HNSWIndex:
+    kind = "hnsw"
+
+    def __init__(self, index, ef_search: int = 64):
+        self.index = index
+        self.ef_search = ef_search
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, m: int = 32, ef_construction: int = 200,
+              block: int = 65536) -> Tuple["HNSWIndex", Dict[str, Any]]:
+        if faiss is None:
+            raise RuntimeError("HNSW needs faiss-cpu (pip install faiss-cpu); use kind='ivf' otherwise.")
+        index = faiss.IndexHNSWFlat(vectors.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        for s in range(0, vectors.shape[0], block):
+            index.add(np.ascontiguousarray(as_f32(vectors[s:s + block])))
+        return cls(index), {"m": m, "ef_construction": ef_construction}
+
+    def search(self, vectors: np.ndarray, q: np.ndarray, k: int, nprobe: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        self.index.hnsw.efSearch = max(self.ef_search, k)
+        scores, idx = self.index.search(q.reshape(1, -1).astype(np.float32), k)
+        keep = idx[0] >= 0
+        return idx[0][keep].astype(np.int64), scores[0][keep]
+
+    def save(self, d: str) -> None:
+        faiss.write_index(self.index, os.path.join(d, "ann.hnsw.faiss"))
+
+    @classmethod
+    def load(cls, d: str, ef_search: int) -> "HNSWIndex":
+        if faiss is None:
+            raise RuntimeError("faiss-cpu is not installed.")
+        return cls(faiss.read_index(os.path.join(d, "ann.hnsw.faiss")), ef_search=ef_search)
+
+    def settings(self) -> List[Dict[str, int]]:
+        return [{"ef_search": e} for e in (16, 32, 64, 128, 256)]
+
+    def apply(self, setting: Dict[str, int]) -> None:
+        self.ef_search = setting["ef_search"]
+
+
+# --- evaluation ---
+def self_query_truth(vectors: np.ndarray, k: int, queries: int = 200,
+                     seed: int = 1) -> Tuple[np.ndarray, List[set], float]:
+    """
+    (queries, exact top-k row sets, mean exact-scan ms) for a recall evaluation. Queries are
+    collection rows (self-queries), so the recall measured against them is an upper bound.
+    """
+    n = vectors.shape[0]
+    if not n:
+        return np.zeros((0, 0), dtype=np.float32), [], 0.0
+    rng = np.random.default_rng(seed)
+    qs = as_f32(vectors[np.sort(rng.choice(n, size=min(n, queries), replace=False))])
+    t0 = time.perf_counter()
+    truth = [set(top_k(dense_scores(vectors, q), k).tolist()) for q in qs]
+    return qs, truth, (time.perf_counter() - t0) * 1000 / len(qs)
+
+
+def measure_recall(qs: np.ndarray, truth: List[set], k: int,
+                   search: Callable[[np.ndarray], np.ndarray]) -> Dict[str, float]:
+    """
+    Recall@k and per-query latency of search(q) -> row indexes against self_query_truth.
+    Each query can find at most len(true) = min(k, n) rows, so that is the denominator.
+    """
+    hits, total, lat = 0, 0, []
+    for q, true in zip(qs, truth):
+        t = time.perf_counter()
+        got = search(q)
+        lat.append((time.perf_counter() - t) * 1000)
+        hits += len(true.intersection(np.asarray(got).tolist()))
+        total += len(true)
+    lat.sort()
+    return {
+        "recall": round(hits / max(1, total), 4),
+        "mean_ms": round(sum(lat) / max(1, len(lat)), 3),
+        "p95_ms": round(lat[min(len(lat) - 1, int(0.95 * len(lat)))], 3) if lat else 0.0,
+    }
+
+
+def recall_report(index, vectors: np.ndarray, k: int = 40, queries: int = 200, seed: int = 1) -> Dict[str, Any]:
+    """Recall@k of each search setting against exact top-k, with per-query latency."""
+    qs, truth, exact_ms = self_query_truth(vectors, k, queries, seed)
+    rows = []
+    for setting in index.settings():
+        index.apply(setting)
+        rows.append(dict(setting, **measure_recall(qs, truth, k, lambda q: index.search(vectors, q, k)[0])))
+    return {"k": k, "queries": int(len(qs)), "exact_mean_ms": round(exact_ms, 3), "settings": rows}
+
+
+def pick_setting(report: Dict[str, Any], target: float = RAG_ANN_TARGET_RECALL) -> Dict[str, int]:
+    """Cheapest setting reaching the target recall (else the most accurate one)."""
+    rows = report["settings"]
+    for r in rows:  # settings are ordered cheapest first
+        if r["recall"] >= target:
+            return {k: v for k, v in r.items() if k in ("nprobe", "ef_search")}
+    best = max(rows, key=lambda r: r["recall"])
+    return {k: v for k, v in best.items() if k in ("nprobe", "ef_search")}
+
+
+# --- build / load ---
+def build_for_collection(db_dir: str, name: str, kind: str = "ivf", k: int = 40, **params) -> Dict[str, Any]:
+    """Build the index over the collection's mmap export, evaluate it and record it in the manifest."""
+    from .mmap_store import open_export, update_manifest
+    exp = open_export(db_dir, name)
+    if exp is None:
+        raise RuntimeError(f"No current mmap export for '{name}'; run mmap_store.export_collection first.")
+    vectors = exp["vectors"]
+    t0 = time.perf_counter()
+    index, build_params = (HNSWIndex if kind == "hnsw" else IVFIndex).build(vectors, **params)
+    build_sec = time.perf_counter() - t0
+    index.save(exp["path"])
+
+    report = recall_report(index, vectors, k=k)
+    info = {
+        "kind": index.kind,
+        "params": build_params,
+        "rows": int(vectors.shape[0]),
+        "build_sec": round(build_sec, 2),
+        "built_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "search": pick_setting(report),
+        "report": report,
+    }
+    update_manifest(db_dir, name, "ann", info)
+    return info
+
+
+def should_build(count: int) -> str | None:
+    """Index kind to build at embed time for a collection of this size, or None."""
+    if RAG_ANN == "off" or count < RAG_ANN_MIN_ROWS:
+        return None
+    if RAG_ANN == "hnsw" or (RAG_ANN == "auto" and faiss is not None):
+        return "hnsw"
+    return "ivf"
+
+
+def load_index(export_path: str, manifest: Dict[str, Any]):
+    """The collection's ANN index configured at its recorded operating point, or None."""
+    info = manifest.get("ann") or {}
+    if RAG_ANN == "off" or not info:
+        return None
+    setting = info.get("search") or {}
+    if info.get("kind") == "hnsw":
+        if faiss is None or not os.path.isfile(os.path.join(export_path, "ann.hnsw.faiss")):
+            return None
+        return HNSWIndex.load(export_path, ef_search=int(os.environ.get("RAG_ANN_EF_SEARCH", setting.get("ef_search", 64))))
+    if not os.path.isfile(os.path.join(export_path, "ann.ivf_centroids.npy")):
+        return None
+    return IVFIndex.load(export_path, nprobe=int(os.environ.get("RAG_ANN_NPROBE", setting.get("nprobe", 8))))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build an ANN index for a collection and report recall vs latency.")
+    ap.add_argument("collection")
+    ap.add_argument("--db-dir", default=RAG_DB_DIR)
+    ap.add_argument("--kind", choices=["ivf", "hnsw"], default="ivf")
+    ap.add_argument("--nlist", type=int, default=None, help="IVF lists (default 4*sqrt(n))")
+    ap.add_argument("--m", type=int, default=32, help="HNSW graph degree")
+    ap.add_argument("--k", type=int, default=40, help="recall@k to evaluate (recall_k used by node_research)")
+    args = ap.parse_args()
+    params = {"nlist": args.nlist} if args.kind == "ivf" else {"m": args.m}
+    info = build_for_collection(args.db_dir, args.collection, kind=args.kind, k=args.k, **params)
+    print(json.dumps(info, indent=2))
+
+
+if __name__ == "__main__":
+    main()
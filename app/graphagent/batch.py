@@ -0,0 +1,166 @@
+# app/graphagent/batch.py
+from __future__ import annotations
+
+import json
+import math
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List
+
+from .pipeline import run_pipeline
+from .tracing import Tracer, tracing
+
+
+def read_tasks(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a JSONL task file. Each line is {"id": ..., "task": "..."} or a bare JSON string.
+    Missing ids default to the 1-based line number so resume still works.
+    """
+    tasks: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, raw in enumerate(f, 1):
+            raw = raw.strip()
+            if not raw:
+                continue
+            obj = json.loads(raw)
+            if isinstance(obj, str):
+                obj = {"task": obj}
+            task = str(obj.get("task") or "").strip()
+            if not task:
+                continue
+            tasks.append({"id": str(obj.get("id") or lineno), "task": task})
+    return tasks
+
+
+def completed_ids(out_path: str) -> set[str]:
+    """Ids already written to out_path without an error (failed tasks are retried on resume)."""
+    done: set[str] = set()
+    if not os.path.isfile(out_path):
+        return done
+    with open(out_path, "r", encoding="utf-8") as f:
+        for raw in f:
+            try:
+                obj = json.loads(raw)
+            except ValueError:
+                continue  # unparseable line (trim_partial_line removes a trailing partial one)
+            if isinstance(obj, dict) and obj.get("id") is not None and not obj.get("error"):
+                done.add(str(obj["id"]))
+    return done
+
+
+def trim_partial_line(out_path: str, block: int = 65536) -> int:
+    """
+    Cut a trailing line with no newline (a record half-written when the previous run died),
+    so the next append starts on a fresh line. Returns the number of bytes removed.
+    """
+    if not os.path.isfile(out_path):
+        return 0
+    with open(out_path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+        end = size
+        while end > 0:
+            start = max(0, end - block)
+            f.seek(start)
+            nl = f.read(end - start).rfind(b"\n")
+            if nl >= 0:
+                end = start + nl + 1
+                break
+            end = start
+        f.truncate(end)
+        return size - end
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def run_batch(
+    tasks_path: str,
+    out_path: str,
+    spec: Dict[str, Any],
+    concurrency: int = 4,
+    resume: bool = True,
+    log: Callable[[str], None] = print,
+) -> Dict[str, Any]:
+    """
+    Run every task in tasks_path through run_pipeline inside this process,
+    `concurrency` at a time, appending one JSON line per finished task to out_path.
+    With resume=True, ids already completed in out_path are skipped.
+    Returns aggregate stats (throughput, p50/p95 latency).
+    """
+    tasks = read_tasks(tasks_path)
+    if resume:
+        cut = trim_partial_line(out_path)
+        if cut:
+            log(f"[batch] dropped a partial last line ({cut} bytes) from {out_path}")
+    done = completed_ids(out_path) if resume else set()
+    todo = [t for t in tasks if t["id"] not in done]
+    log(f"[batch] {len(tasks)} tasks, {len(tasks) - len(todo)} already done, {len(todo)} to run (concurrency={concurrency})")
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    latencies: List[float] = []
+    failed = 0
+
+    def run_one(item: Dict[str, Any]) -> Dict[str, Any]:
+        t0 = time.time()
+        tracer = Tracer(run_id=item["id"])
+        try:
+            with tracing(tracer):
+                state = run_pipeline(item["task"], spec)
+            return {
+                "id": item["id"],
+                "task": item["task"],
+                "result": getattr(state, "result", ""),
+                "evidence": list(getattr(state, "evidence", [])),
+                "elapsed_sec": time.time() - t0,
+                "trace": tracer.summary(),
+            }
+        except Exception as e:
+            return {
+                "id": item["id"],
+                "task": item["task"],
+                "error": f"Pipeline failed: {e}",
+                "traceback": traceback.format_exc(),
+                "elapsed_sec": time.time() - t0,
+            }
+
+    t_start = time.time()
+    with open(out_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch") as pool:
+        futs = [pool.submit(run_one, t) for t in todo]
+        for n, fut in enumerate(as_completed(futs), 1):
+            rec = fut.result()
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            out.flush()
+            if rec.get("error"):
+                failed += 1
+                log(f"[batch] {n}/{len(todo)} {rec['id']}: ERROR {rec['error']}")
+            else:
+                latencies.append(rec["elapsed_sec"])
+                log(f"[batch] {n}/{len(todo)} {rec['id']}: {rec['elapsed_sec']:.2f}s")
+    wall = time.time() - t_start
+
+    finished = len(todo)
+    return {
+        "total": len(tasks),
+        "skipped": len(tasks) - len(todo),
+        "completed": finished - failed,
+        "failed": failed,
+        "wall_sec": wall,
+        "tasks_per_min": (finished / wall * 60.0) if wall > 0 else 0.0,
+        "p50_sec": percentile(latencies, 50),
+        "p95_sec": percentile(latencies, 95),
+        "out": out_path,
+    }
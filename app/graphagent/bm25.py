@@ -0,0 +1,120 @@
+# app/graphagent/bm25.py
+# Inverted index with Okapi BM25 scoring (pure Python, incremental) and
+# reciprocal rank fusion for combining ranked lists (lexical + dense, multi-query).
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import pickle
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with vs".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    BM25 over an inverted index: term -> {slot: tf}. Documents are added or
+    removed one at a time (no rebuild); keys are any hashable id (chunk id, row index).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.keys: List[Hashable | None] = []      # slot -> key (None once removed)
+        self.lengths: List[int] = []
+        self.terms: List[Tuple[str, ...]] = []     # slot -> distinct terms, for remove()
+        self.slots: Dict[Hashable, int] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def add(self, key: Hashable, text: str) -> None:
+        if key in self.slots:
+            self.remove(key)
+        toks = tokenize(text)
+        tf = Counter(toks)
+        slot = len(self.keys)
+        self.keys.append(key)
+        self.lengths.append(len(toks))
+        self.terms.append(tuple(tf))
+        self.slots[key] = slot
+        self.total_len += len(toks)
+        for term, n in tf.items():
+            self.postings.setdefault(term, {})[slot] = n
+
+    def add_many(self, items: Iterable[Tuple[Hashable, str]]) -> None:
+        for key, text in items:
+            self.add(key, text)
+
+    def remove(self, key: Hashable) -> bool:
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return False
+        for term in self.terms[slot]:
+            plist = self.postings.get(term)
+            if plist is not None:
+                plist.pop(slot, None)
+                if not plist:
+                    del self.postings[term]
+        self.total_len -= self.lengths[slot]
+        self.keys[slot] = None
+        self.terms[slot] = ()
+        self.lengths[slot] = 0
+        return True
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Hashable, float]]:
+        """[(key, score)] best first; only documents sharing a term with the query."""
+        n = len(self.slots)
+        if not n:
+            return []
+        avgdl = self.total_len / n or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1.0 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for slot, tf in plist.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self.lengths[slot] / avgdl)
+                scores[slot] = scores.get(slot, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+        return [(self.keys[slot], s) for slot, s in best]
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path: str) -> "BM25Index":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def rrf(rankings: Sequence[Sequence[Any]], k: int = 60, key: Callable[[Any], Hashable] = lambda x: x) -> List[Tuple[Any, float]]:
+    """
+    Reciprocal rank fusion: score(d) = sum over lists of 1 / (k + rank). Returns
+    [(first item seen for that key, score)] best first; ties keep first-seen order.
+    """
+    fused: Dict[Hashable, List[Any]] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            kk = key(item)
+            if kk in fused:
+                fused[kk][1] += 1.0 / (k + rank)
+            else:
+                fused[kk] = [item, 1.0 / (k + rank)]
+    return sorted(((item, s) for item, s in fused.values()), key=lambda p: -p[1])
@@ -0,0 +1,74 @@
+# app/graphagent/checkpoint.py
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from dataclasses import asdict, fields
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+from .core import State
+
+CHECKPOINT_DIR = os.environ.get(
+    "GRAPHAGENT_CHECKPOINT_DIR", os.path.join(os.path.expanduser("~"), ".graphagent", "runs")
+)
+
+
+def new_run_id() -> str:
+    return datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+
+
+def state_from_dict(data: Dict[str, Any]) -> State:
+    """Rebuild a State from a snapshot, ignoring fields this version doesn't know."""
+    known = {f.name for f in fields(State)}
+    return State(**{k: v for k, v in data.items() if k in known})
+
+
+class CheckpointStore:
+    """
+    Append-only JSONL per run (<root>/<run_id>.jsonl). One line per completed node:
+      {"node": "write", "next": "critic", "state": {...State...}, "ts": "..."}
+    The last complete line is the resume point; a torn final line is ignored.
+    """
+
+    def __init__(self, root: str = CHECKPOINT_DIR):
+        self.root = root
+
+    def path(self, run_id: str) -> str:
+        safe = "".join(ch for ch in run_id if ch.isalnum() or ch in "-_.")
+        return os.path.join(self.root, f"{safe}.jsonl")
+
+    def save(self, run_id: str, state: State, node: str, next_node: str) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        rec = {
+            "node": node,
+            "next": next_node,
+            "state": asdict(state),
+            "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        }
+        with open(self.path(run_id), "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self, run_id: str) -> Tuple[State, str] | None:
+        """(state, next node) after the last completed node, or None if nothing was saved."""
+        p = self.path(run_id)
+        if not os.path.isfile(p):
+            return None
+        last = None
+        with open(p, "r", encoding="utf-8") as f:
+            for raw in f:
+                try:
+                    last = json.loads(raw)
+                except ValueError:
+                    continue
+        if not last:
+            return None
+        return state_from_dict(last["state"]), str(last.get("next") or "end")
+
+    def list_runs(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.path.splitext(n)[0] for n in os.listdir(self.root) if n.endswith(".jsonl"))
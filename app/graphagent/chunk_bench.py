@@ -0,0 +1,168 @@
+# app/graphagent/chunk_bench.py
+# Micro-benchmark for ingest.sentence_chunks over a synthetic Markdown corpus.
+# Before timing, it checks that the output is identical to the original
+# concatenating implementation (kept below as the golden reference; the same
+# comparison runs in tests/test_sentence_chunks.py).
+# Packing is timed on pre-split sentences, best of --repeat runs, so the
+# sentence splitter (shared by both versions) does not swamp the difference.
+#
+#   python -m app.graphagent.chunk_bench --docs 200 --kb 256 --repeat 7
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from .ingest import pack_sentences, sentence_chunks, split_sentences
+
+_WORDS = ("retrieval embedding vector chunk overlap sentence markdown index query model token batch "
+          "collection manifest profile latency throughput cache score rerank").split()
+
+
+def reference_sentence_chunks(text: str, chunk_size: int, overlap_pct: float) -> List[str]:
+    """The pre-rewrite sentence_chunks, verbatim apart from the shared sentence splitter."""
+    return _reference_pack(split_sentences(text), chunk_size, int(chunk_size * overlap_pct))
+
+
+def _reference_pack(sents: List[str], chunk_size: int, overlap_chars: int) -> List[str]:
+    chunks: List[str] = []
+    buf = ""
+    for s in sents:
+        if not s:
+            continue
+        candidate = (buf + (" " if buf and not buf.endswith("\n") else "") + s) if buf else s
+        if len(candidate) <= chunk_size:
+            buf = candidate
+        else:
+            if buf:
+                chunks.append(buf.strip())
+            if chunks and overlap_chars > 0:
+                tail = chunks[-1][-overlap_chars:]
+                buf = (tail + " " + s).strip()
+            else:
+                buf = s
+    if buf:
+        chunks.append(buf.strip())
+    return [c for c in chunks if c]
+
+
+def synthetic_doc(rng: random.Random, size: int) -> str:
+    """Markdown-ish text of about `size` chars: headings, paragraphs, bullets, the odd very long sentence."""
+    out: List[str] = []
+    n = 0
+    while n < size:
+        r = rng.random()
+        if r < 0.05:
+            piece = "## " + " ".join(rng.choices(_WORDS, k=rng.randint(2, 6))) + "\n"
+        elif r < 0.15:
+            piece = "- " + " ".join(rng.choices(_WORDS, k=rng.randint(3, 12))) + ".\n"
+        elif r < 0.17:
+            piece = " ".join(rng.choices(_WORDS, k=rng.randint(150, 400))) + ". "
+        else:
+            piece = " ".join(rng.choices(_WORDS, k=rng.randint(4, 30))).capitalize() + ". "
+        out.append(piece)
+        n += len(piece)
+    return "".join(out)
+
+
+def sentence_cases(rng: random.Random, count: int) -> List[List[str]]:
+    """Random sentence lists with the awkward inputs the tokenizers can produce."""
+    pool = ["", " ", "\n", "line\n", "  padded  ", "x" * 900, "short."]
+    cases = []
+    for _ in range(count):
+        sents = []
+        for _ in range(rng.randint(0, 60)):
+            if rng.random() < 0.2:
+                sents.append(rng.choice(pool))
+            else:
+                sents.append(" ".join(rng.choices(_WORDS, k=rng.randint(1, 80))))
+        cases.append(sents)
+    return cases
+
+
+GOLDEN_SETTINGS = ((300, 0.0), (650, 0.15), (1200, 0.3))
+
+
+def golden_mismatches(docs: List[str], seed: int = 0, lists: int = 200) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Compare new vs reference on the corpus and on `lists` random sentence lists per setting.
+    Returns (cases checked, [{"chunk_size", "overlap", "input"} for every case that differs]).
+    """
+    rng = random.Random(seed)
+    checked = 0
+    bad: List[Dict[str, Any]] = []
+    for chunk_size, overlap in GOLDEN_SETTINGS:
+        for d in docs:
+            if sentence_chunks(d, chunk_size, overlap) != reference_sentence_chunks(d, chunk_size, overlap):
+                bad.append({"chunk_size": chunk_size, "overlap": overlap, "input": d[:200]})
+            checked += 1
+        oc = int(chunk_size * overlap)
+        for sents in sentence_cases(rng, lists):
+            if pack_sentences(sents, chunk_size, oc) != _reference_pack(sents, chunk_size, oc):
+                bad.append({"chunk_size": chunk_size, "overlap": overlap, "input": sents})
+            checked += 1
+    return checked, bad
+
+
+def _time(fns: List[Callable[[Any], Any]], items: List[Any], repeat: int) -> List[float]:
+    """Best-of-repeat seconds per fn over items. Runs alternate between fns (so drift in
+    machine load hits all of them alike) with the garbage collector off, as timeit does."""
+    best = [float("inf")] * len(fns)
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            for j, fn in enumerate(fns):
+                t0 = time.perf_counter()
+                for it in items:
+                    fn(it)
+                best[j] = min(best[j], time.perf_counter() - t0)
+    finally:
+        if enabled:
+            gc.enable()
+    return best
+
+
+def run_bench(docs: int = 200, kb: int = 64, chunk_size: int = 650, overlap: float = 0.15,
+              repeat: int = 7, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    corpus = [synthetic_doc(rng, kb * 1024) for _ in range(docs)]
+    checked, bad = golden_mismatches(corpus[: min(len(corpus), 20)], seed=seed)
+    if bad:
+        raise RuntimeError(f"sentence_chunks differs from the reference in {len(bad)} of {checked} cases: {bad[0]}")
+    mb = sum(len(d) for d in corpus) / 1e6
+    oc = int(chunk_size * overlap)
+    split = [split_sentences(d) for d in corpus]
+    t_split, = _time([split_sentences], corpus, repeat)
+    t_ref, t_new = _time([lambda s: _reference_pack(s, chunk_size, oc), lambda s: pack_sentences(s, chunk_size, oc)],
+                         split, repeat)
+    return {
+        "docs": docs,
+        "corpus_mb": round(mb, 2),
+        "golden_cases": checked,
+        "split_sec": round(t_split, 4),
+        "reference_pack_sec": round(t_ref, 4),
+        "new_pack_sec": round(t_new, 4),
+        "reference_mb_per_sec": round(mb / (t_split + t_ref), 1),
+        "new_mb_per_sec": round(mb / (t_split + t_new), 1),
+        "packing_speedup": round(t_ref / max(1e-9, t_new), 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark sentence_chunks against the reference implementation.")
+    ap.add_argument("--docs", type=int, default=200)
+    ap.add_argument("--kb", type=int, default=64, help="Approximate size of each synthetic document")
+    ap.add_argument("--chunk-size", type=int, default=650)
+    ap.add_argument("--overlap", type=float, default=0.15)
+    ap.add_argument("--repeat", type=int, default=7, help="Timed runs per implementation (best one is kept)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    print(json.dumps(run_bench(args.docs, args.kb, args.chunk_size, args.overlap, args.repeat, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
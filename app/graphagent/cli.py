@@ -9,6 +9,14 @@ import time
 import traceback
 
 from .pipeline import load_pipeline, run_pipeline, ascii_from_spec
+from .llm_client import endpoint_info, cache_stats
+from .batch import run_batch
+from .checkpoint import CheckpointStore, new_run_id
+from .tracing import Tracer, tracing
+try:
+    from . import rag_integration
+except ImportError:  # retrieval backend not importable; the pipeline falls back without it
+    rag_integration = None
 
 
 def main():
@@ -20,6 +28,25 @@ def main():
         action="store_true",
         help="Emit structured JSON (graph, result, evidence, scratch, elapsed_sec)",
     )
+    ap.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream write/critic tokens as they arrive; with --json, emit NDJSON events (node, token, result)",
+    )
+    ap.add_argument(
+        "--mode",
+        choices=["sequential", "dag"],
+        default=None,
+        help="Executor: sequential (one node at a time) or dag (parallel research/math branches)",
+    )
+    ap.add_argument("--checkpoint", action="store_true", help="Snapshot State after every node (prints the run id)")
+    ap.add_argument("--run-id", type=str, default="", help="Run id for --checkpoint (default: generated)")
+    ap.add_argument("--resume", type=str, default="", metavar="RUN_ID", help="Resume a checkpointed run from its last completed node")
+    ap.add_argument("--trace-out", type=str, default="", help="Append per-node/LLM/retrieval spans to this JSONL file")
+    ap.add_argument("--batch", type=str, default="", help="Run every task in a JSONL file ({\"id\", \"task\"} per line)")
+    ap.add_argument("--out", type=str, default="", help="Results JSONL for --batch (default: <batch>.results.jsonl)")
+    ap.add_argument("--concurrency", type=int, default=4, help="Pipelines run at once in --batch mode")
+    ap.add_argument("--no-resume", action="store_true", help="In --batch mode, rerun tasks already in --out")
     args = ap.parse_args()
 
     # Load pipeline spec
@@ -29,6 +56,44 @@ def main():
         tb = traceback.format_exc()
         print(f"[ERROR] Failed to load pipeline '{args.pipeline}': {e}\n{tb}")
         sys.exit(1)
+    if args.mode:
+        spec["mode"] = args.mode
+
+    want_json = args.json or os.environ.get("RAG_UI_JSON", "").lower() in ("1", "true", "yes", "y")
+
+    if args.batch:
+        out_path = args.out or os.path.splitext(args.batch)[0] + ".results.jsonl"
+        summary = run_batch(
+            args.batch, out_path, spec,
+            concurrency=args.concurrency,
+            resume=not args.no_resume,
+            log=lambda m: print(m, file=sys.stderr, flush=True),
+        )
+        if want_json:
+            print(json.dumps(summary, ensure_ascii=False))
+        else:
+            print(
+                f"\n=== BATCH ===\n"
+                f"{summary['completed']} ok, {summary['failed']} failed, {summary['skipped']} skipped "
+                f"in {summary['wall_sec']:.1f}s ({summary['tasks_per_min']:.1f} tasks/min)\n"
+                f"latency p50 {summary['p50_sec']:.2f}s, p95 {summary['p95_sec']:.2f}s\n"
+                f"results: {summary['out']}"
+            )
+        sys.exit(1 if summary["failed"] else 0)
+
+    store = None
+    run_id = args.resume or args.run_id
+    if args.checkpoint or args.resume:
+        store = CheckpointStore()
+        run_id = run_id or new_run_id()
+        saved = store.load(run_id)
+        if args.resume and saved is None:
+            print(f"[ERROR] No checkpoint found for run '{run_id}' in {store.root}")
+            sys.exit(1)
+        if saved:
+            args.task = saved[0].task
+        if not want_json:
+            print(f"[checkpoint] run id: {run_id}" + (f" (resuming at '{saved[1]}')" if saved else ""))
 
     # Determine task
     task = (args.task or "").strip()
@@ -40,24 +105,53 @@ def main():
     if not task:
         task = "Compare xeriscape vs turf; compute 5*7"
 
-    want_json = args.json or os.environ.get("RAG_UI_JSON", "").lower() in ("1", "true", "yes", "y")
+    want_stream = args.stream or os.environ.get("RAG_UI_STREAM", "").lower() in ("1", "true", "yes", "y")
+
+    def emit(event: dict):
+        print(json.dumps(event, ensure_ascii=False), flush=True)
 
+    on_node = on_token = None
+    if want_stream and want_json:
+        on_node = lambda n: emit({"event": "node", "node": n})
+        on_token = lambda n, t: emit({"event": "token", "node": n, "text": t})
+    elif want_stream:
+        streamed = {"node": ""}
+
+        def on_token(n: str, t: str):
+            if streamed["node"] != n:
+                streamed["node"] = n
+                print(f"\n---- {n} ----", flush=True)
+            sys.stdout.write(t)
+            sys.stdout.flush()
+
+    tracer = Tracer(run_id=run_id or None)
     t0 = time.time()
     try:
-        state = run_pipeline(task, spec)
+        with tracing(tracer):
+            state = run_pipeline(task, spec, on_node=on_node, on_token=on_token, checkpoint=store, run_id=run_id or None)
     except Exception as e:
         tb = traceback.format_exc()
+        if args.trace_out:
+            tracer.export_jsonl(args.trace_out)
         if want_json:
             err_payload = {
                 "error": f"Pipeline failed: {e}",
                 "traceback": tb,
+                "run_id": run_id if store else None,
             }
-            print(json.dumps(err_payload, ensure_ascii=False))
+            if want_stream:
+                emit({"event": "error", **err_payload})
+            else:
+                print(json.dumps(err_payload, ensure_ascii=False))
         else:
             print(f"\n[ERROR] Pipeline failed: {e}\n{tb}")
+            if store:
+                print(f"Resume with: --resume {run_id}")
         sys.exit(1)
 
     dt = time.time() - t0
+    if args.trace_out:
+        tracer.export_jsonl(args.trace_out)
 
     # Build structured payload
     payload = {
@@ -65,11 +159,20 @@ def main():
         "result": getattr(state, "result", ""),
         "evidence": list(getattr(state, "evidence", [])),
         "scratch": list(getattr(state, "scratch", []))[-5:],
+        "route": list(getattr(state, "route_log", [])),
+        "run_id": run_id if store else None,
         "elapsed_sec": dt,
+        "llm_endpoint": endpoint_info(),
+        "llm_cache": cache_stats(),
+        "retrieval_cache": rag_integration.cache_stats() if rag_integration else None,
+        "trace": {"summary": tracer.summary(), "spans": tracer.spans},
     }
 
     if want_json:
-        print(json.dumps(payload, ensure_ascii=False))
+        if want_stream:
+            emit({"event": "result", **payload})
+        else:
+            print(json.dumps(payload, ensure_ascii=False))
         return
 
     # Legacy pretty text output
@@ -77,6 +180,29 @@ def main():
     print(payload["graph"])
     print(f"\nResult in {dt:.2f}s:\n{payload['result']}\n")
 
+    ep = payload["llm_endpoint"]
+    if ep:
+        print(f"LLM endpoint: {ep['mode']} ({ep['source']}, probe {ep.get('probe_ms') or 0:.0f} ms)\n")
+    tr = payload["trace"]["summary"]
+    if tr["nodes"]:
+        print("Timing: " + ", ".join(f"{n} {v['ms'] / 1000:.2f}s" for n, v in tr["nodes"].items()))
+        print(
+            f"LLM: {tr['llm']['calls']} calls, {tr['llm']['ms'] / 1000:.2f}s, "
+            f"{tr['llm']['prompt_tokens']}+{tr['llm']['completion_tokens']} tokens, "
+            f"{tr['llm']['cache_hits']} cache hits; retrieval: {tr['retrieval']['calls']} calls, "
+            f"{tr['retrieval']['ms'] / 1000:.2f}s"
+            + "".join(f", {n} {v['ms'] / 1000:.2f}s" for n, v in tr["retrieval"]["stages"].items())
+            + "\n"
+        )
+    if payload["route"]:
+        print("Route decisions: " + ", ".join(payload["route"]) + "\n")
+    cs = payload["llm_cache"]
+    if cs:
+        print(f"LLM cache: {cs['hits']} hits / {cs['misses']} misses\n")
+    rc = payload["retrieval_cache"]
+    if rc:
+        print("Retrieval cache: " + ", ".join(f"{k} {v['hits']} hits / {v['misses']} misses" for k, v in rc.items()) + "\n")
+
     if payload["evidence"]:
         print("---- Evidence ----")
         for e in payload["evidence"]:
@@ -9,7 +9,68 @@ MODEL    = os.environ.get("LOCAL_LLM_MODEL", "qwen/qwen2.5-vl-7b")
 TEMPERATURE = float(os.environ.get("LOCAL_LLM_TEMPERATURE", "0.2"))
 MAX_TOKENS  = int(os.environ.get("LOCAL_LLM_MAX_TOKENS", "800"))
 
+# Client pool: max requests in flight per event loop, and per-request timeout (seconds;
+# 600 is the openai client's own default, long local generations need it)
+LLM_MAX_CONCURRENCY = int(os.environ.get("LOCAL_LLM_MAX_CONCURRENCY", "4"))
+LLM_TIMEOUT         = float(os.environ.get("LOCAL_LLM_TIMEOUT", "600"))
+
+# Endpoint mode: "auto" probes chat vs completions once per API_BASE/MODEL; "chat"/"completions" force it.
+# LLM_MODE_CACHE (optional JSON path) keeps probe results across processes.
+LLM_ENDPOINT_MODE = os.environ.get("LOCAL_LLM_ENDPOINT_MODE", "auto").lower()
+LLM_MODE_CACHE    = os.environ.get("LOCAL_LLM_MODE_CACHE", "")
+# Retries for transient failures (connection errors, 429/5xx); read timeouts are never retried
+LLM_RETRIES       = int(os.environ.get("LOCAL_LLM_RETRIES", "2"))
+
+# Response cache for deterministic node calls (plan/route/query expansion/math); off unless LOCAL_LLM_CACHE=1.
+# LLM_CACHE_PATH="" keeps only the in-memory tier.
+LLM_CACHE             = os.environ.get("LOCAL_LLM_CACHE", "0").lower() in ("1", "true", "yes", "y")
+LLM_CACHE_PATH        = os.environ.get("LOCAL_LLM_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".graphagent", "llm_cache.sqlite"))
+LLM_CACHE_MEMORY      = int(os.environ.get("LOCAL_LLM_CACHE_MEMORY", "512"))
+LLM_CACHE_TTL         = float(os.environ.get("LOCAL_LLM_CACHE_TTL", str(7 * 86400)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LOCAL_LLM_CACHE_MAX_ENTRIES", "50000"))
+
 # RAG defaults
 VECTOR_ROOT = os.environ.get("VECTOR_ROOT", r"C:\Users\gmoores\Desktop\AI\RAG")
 TOP_K       = int(os.environ.get("RAG_TOP_K", "4"))
 
+# Retrieval backend: "external" = rag_core under RAG_HOME, "builtin" = app.graphagent.retrieval
+RAG_BACKEND        = os.environ.get("RAG_BACKEND", "external").lower()
+RAG_DB_DIR         = os.environ.get("RAG_DB_DIR", r"C:\Users\gmoores\Desktop\AI\RAG\vector_store")
+RAG_BASE           = os.environ.get("RAG_BASE", "markdown_chunks")
+RAG_MD_DIR         = os.environ.get("RAG_MD_DIR", r"C:\Users\gmoores\Desktop\AI\RAG\data\markdown_files")
+RAG_RERANKER_MODEL = os.environ.get("RAG_RERANKER_MODEL", "BAAI/bge-reranker-base")
+# Memory-mapped vector export (mmap_store): written by run_embed, preferred by retrieval when current
+RAG_MMAP       = os.environ.get("RAG_MMAP", "1") not in ("0", "false", "no")
+RAG_MMAP_DTYPE = os.environ.get("RAG_MMAP_DTYPE", "float32")
+# ANN recall (ann_index) for large collections: "auto" (hnsw with faiss, else ivf), "ivf", "hnsw", "off".
+# Built at embed time once a collection has RAG_ANN_MIN_ROWS chunks; the search setting is the
+# cheapest one reaching RAG_ANN_TARGET_RECALL in the build-time report (override: RAG_ANN_NPROBE / RAG_ANN_EF_SEARCH).
+RAG_ANN               = os.environ.get("RAG_ANN", "auto").lower()
+RAG_ANN_MIN_ROWS      = int(os.environ.get("RAG_ANN_MIN_ROWS", "200000"))
+RAG_ANN_TARGET_RECALL = float(os.environ.get("RAG_ANN_TARGET_RECALL", "0.95"))
+# Hybrid recall in the built-in backend: BM25 candidates fused with dense ones by reciprocal rank fusion
+RAG_HYBRID    = os.environ.get("RAG_HYBRID", "1") not in ("0", "false", "no")
+RAG_RRF_K     = int(os.environ.get("RAG_RRF_K", "60"))
+RAG_LEXICAL_K = int(os.environ.get("RAG_LEXICAL_K", "0"))   # 0 = same as recall_k
+# Query-embedding LRU entries (keyed by model + whitespace-normalised query)
+RAG_QUERY_CACHE = int(os.environ.get("RAG_QUERY_CACHE", "1024"))
+# Cross-encoder rerank: score cache entries, predict() batch size, candidates scored per query
+# (0 = all of recall_k) and an optional score floor (empty = keep everything)
+RAG_RERANK_CACHE     = int(os.environ.get("RAG_RERANK_CACHE", "20000"))
+RAG_RERANK_BATCH     = int(os.environ.get("RAG_RERANK_BATCH", "64"))
+RAG_RERANK_TOP_M     = int(os.environ.get("RAG_RERANK_TOP_M", "0"))
+RAG_RERANK_MIN_SCORE = float(os.environ["RAG_RERANK_MIN_SCORE"]) if os.environ.get("RAG_RERANK_MIN_SCORE") else None
+# Ingest parse workers (processes); unset = cores - 1, 0 = parse in the calling process
+RAG_INGEST_WORKERS = int(os.environ["RAG_INGEST_WORKERS"]) if os.environ.get("RAG_INGEST_WORKERS") else None
+# Passage-embedding cache (embed_cache) keyed by model + chunk text hash, shared by all profiles in a db_dir.
+# RAG_EMBED_CACHE_PATH="" = <db_dir>/_collections/_embeddings.sqlite
+RAG_EMBED_CACHE      = os.environ.get("RAG_EMBED_CACHE", "1") not in ("0", "false", "no")
+RAG_EMBED_CACHE_PATH = os.environ.get("RAG_EMBED_CACHE_PATH", "")
+# Near-duplicate chunks at ingest (dedup): "off", "drop" (not indexed) or "link" (indexed with dup_of, collapsed in top-k);
+# RAG_DEDUP_DISTANCE = max SimHash Hamming distance (64-bit) counted as a duplicate
+RAG_DEDUP          = os.environ.get("RAG_DEDUP", "off").lower()
+RAG_DEDUP_DISTANCE = int(os.environ.get("RAG_DEDUP_DISTANCE", "6"))
+# int8 copy of the mmap export (quant) for first-pass dense scoring: "off" or "int8"; built at embed time.
+# The top k * RAG_QUANT_RESCORE int8 candidates are rescored exactly against the float vectors.
+RAG_QUANT         = os.environ.get("RAG_QUANT", "off").lower()
+RAG_QUANT_RESCORE = int(os.environ.get("RAG_QUANT_RESCORE", "4"))
@@ -1,12 +1,13 @@
 # app/graphagent/core.py
 from __future__ import annotations
 
-import ast, json, os
+import ast, contextvars, json, os, time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dataclasses import dataclass, field
-from typing import List, Dict, Callable
+from typing import Any, List, Dict, Callable, Tuple
 
 from .llm_client import call_llm
-from .rag_integration import search_docs  # correct import
+from .rag_integration import search_docs, search_docs_many, BATCH_SEARCH  # correct import
 
 
 # --- math sandbox ---
@@ -28,6 +29,76 @@ def safe_eval_math(expr: str) -> str:
     return str(eval(compile(node, "<math>", "eval"), {"__builtins__": {}}, {}))
 
 
+# --- bounded fan-out ---
+def map_ordered(fn: Callable[[Any], Any], items: List[Any], workers: int, timeout: float) -> Tuple[List[Any], List[int]]:
+    """
+    Run fn over items on a thread pool and return (results, timed_out_indexes).
+    Results keep input order. An item that runs longer than `timeout` seconds
+    (measured from when it starts) is given up on and its result is None.
+    workers <= 1 runs sequentially in the calling thread.
+    """
+    if workers <= 1 or len(items) <= 1:
+        return [fn(x) for x in items], []
+
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(items)), thread_name_prefix="fanout")
+    started: List[float | None] = [None] * len(items)
+
+    def run(i: int, x: Any):
+        started[i] = time.monotonic()
+        return fn(x)
+
+    # each item runs in a copy of the caller's context so trace spans nest correctly
+    futs = [pool.submit(contextvars.copy_context().run, run, i, x) for i, x in enumerate(items)]
+    out: List[Any] = [None] * len(items)
+    timed_out: List[int] = []
+    pending = set(range(len(items)))
+    # Items stuck behind timed-out workers may never start; cap the whole fan-out too.
+    hard_deadline = time.monotonic() + timeout * (len(items) // max(1, min(workers, len(items))) + 1)
+    try:
+        while pending:
+            now = time.monotonic()
+            expiries = [started[i] + timeout for i in pending if started[i] is not None]
+            wait_for = max(0.0, min(expiries + [hard_deadline]) - now)
+            wait([futs[i] for i in pending], timeout=wait_for, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for i in sorted(pending):
+                if futs[i].done():
+                    pending.discard(i)
+                    out[i] = futs[i].result()
+                elif now >= hard_deadline or (started[i] is not None and now - started[i] >= timeout):
+                    pending.discard(i)
+                    timed_out.append(i)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return out, sorted(timed_out)
+
+
+def fanout_deadline(n: int, workers: int, timeout: float) -> float | None:
+    """Whole-call budget map_ordered gives n items (None: sequential, no deadline)."""
+    if workers <= 1 or n <= 1:
+        return None
+    return timeout * (n // min(workers, n) + 1)
+
+
+def call_with_deadline(fn: Callable[[], Any], deadline: float | None) -> Tuple[Any, bool]:
+    """
+    Run fn() and return (result, timed_out). With a deadline it runs on a worker
+    thread that is given up on after `deadline` seconds (result None); exceptions
+    from fn propagate. deadline None runs it in the calling thread.
+    """
+    if deadline is None:
+        return fn(), False
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fanout")
+    try:
+        fut = pool.submit(contextvars.copy_context().run, fn)
+        done, _ = wait([fut], timeout=deadline)
+        if not done:
+            return None, True
+        return fut.result(), False
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
 # --- agent state ---
 @dataclass
 class State:
@@ -38,6 +109,8 @@ class State:
     result: str = ""
     step: int = 0
     done: bool = False
+    visited: List[str] = field(default_factory=list)    # node names in execution order
+    route_log: List[str] = field(default_factory=list)  # "rule: research" / "llm: write"
 
 
 # --- nodes ---
@@ -45,7 +118,7 @@ def node_plan(state: State) -> str:
     prompt = f"""Plan step-by-step to solve the user task.
 Task: {state.task}
 Return JSON only: {{"subtasks":["..."],"tools":{{"search":true/false,"math":true/false}},"success_criteria":["..."]}}"""
-    js = call_llm(prompt)
+    js = call_llm(prompt, cache=True)
     try:
         plan = json.loads(js[js.find("{"): js.rfind("}") + 1])
     except Exception:
@@ -59,19 +132,73 @@ Return JSON only: {{"subtasks":["..."],"tools":{{"search":true/false,"math":true
     return "route"
 
 
+# tool flag in the plan JSON -> node that provides it
+PLAN_TOOL_NODES: Dict[str, str] = {"search": "research", "math": "math"}
+
+
+def _flag(v: Any) -> bool | None:
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, str) and v.strip().lower() in ("true", "yes", "false", "no"):
+        return v.strip().lower() in ("true", "yes")
+    return None
+
+
+def planned_tools(state: State) -> List[str] | None:
+    """
+    Tool nodes the parsed plan asks for (in PLAN_TOOL_NODES order), or None when
+    the plan has no usable tools block and the caller has to decide another way.
+    Math is dropped for tasks without digits, as node_route always did.
+    """
+    try:
+        plan = json.loads(state.plan) if state.plan else None
+    except Exception:
+        return None
+    tools = plan.get("tools") if isinstance(plan, dict) else None
+    if not isinstance(tools, dict):
+        return None
+    out: List[str] = []
+    for key, node in PLAN_TOOL_NODES.items():
+        flag = _flag(tools.get(key, False))
+        if flag is None:
+            return None
+        if flag:
+            out.append(node)
+    if "math" in out and not any(ch.isdigit() for ch in state.task):
+        out.remove("math")
+    return out
+
+
+def _routed(state: State, nxt: str, how: str) -> str:
+    state.route_log.append(f"{how}: {nxt}")
+    return nxt
+
+
 def node_route(state: State) -> str:
+    """
+    Deterministic when the plan's tools block is usable: run each requested tool
+    node once (in PLAN_TOOL_NODES order), then write. Only a missing/ambiguous
+    plan falls back to asking the LLM.
+    """
+    tools = planned_tools(state)
+    if tools is not None:
+        for node in tools:
+            if node not in state.visited:
+                return _routed(state, node, "rule")
+        return _routed(state, "write", "rule")
+
     prompt = f"""You are a router. Decide next node.
 Context scratch (last 3):\n{chr(10).join(state.scratch[-3:])}
 If math needed -> 'math'; if research needed -> 'research'; if ready -> 'write'.
 Return one token from [research, math, write].
 Task: {state.task}"""
-    choice = (call_llm(prompt) or "").lower()
+    choice = (call_llm(prompt, cache=True) or "").lower()
 
     if "math" in choice and any(ch.isdigit() for ch in state.task):
-        return "math"
+        return _routed(state, "math", "llm")
     if "research" in choice and not state.evidence:
-        return "research"
-    return "write"
+        return _routed(state, "research", "llm")
+    return _routed(state, "write", "llm")
 
 
 def node_research(state: State) -> str:
@@ -84,7 +211,7 @@ def node_research(state: State) -> str:
     prompt = f"""Generate 3 focused search queries for:
 Task: {state.task}
 Return as a JSON list of strings."""
-    qjson = call_llm(prompt)
+    qjson = call_llm(prompt, cache=True)
     try:
         queries = json.loads(qjson[qjson.find("["): qjson.rfind("]") + 1])[:3]
     except Exception:
@@ -96,6 +223,8 @@ Return as a JSON list of strings."""
     rerank_k   = int(os.environ.get("RAG_UI_RERANK_K",  "12"))
     context_k  = int(os.environ.get("RAG_UI_CONTEXT_K", "8"))
     use_rerank = os.environ.get("RAG_UI_RERANK", "1").lower() in ("1","true","yes","y")
+    workers    = int(os.environ.get("RAG_UI_WORKERS", "4"))
+    q_timeout  = float(os.environ.get("RAG_UI_QUERY_TIMEOUT", "60"))
 
     def run_rag(q: str):
         try:
@@ -114,10 +243,34 @@ Return as a JSON list of strings."""
             except Exception:
                 return []
 
+    # Fan out the expansion queries + baseline; per_query keeps this order whatever
+    # finishes first, so the merged evidence matches the old sequential loop.
+    all_queries = list(queries) + [state.task]  # baseline last
+    per_query = None
+    if BATCH_SEARCH:
+        # in-process backend: one call, one batched query encode for all queries, under
+        # the same budget map_ordered gives the fan-out. A timeout gives up on every
+        # query (as the fan-out's hard deadline would); an error falls back to the
+        # per-query path so one bad query only costs its own results.
+        def run_batch():
+            return [(o or {}).get("results", []) or [] for o in search_docs_many(
+                all_queries, profile=prof, recall_k=recall_k, rerank_k=rerank_k,
+                context_k=context_k, rerank=use_rerank)]
+        try:
+            per_query, late = call_with_deadline(run_batch, fanout_deadline(len(all_queries), workers, q_timeout))
+            timed_out = list(range(len(all_queries))) if late else []
+            per_query = per_query or []
+        except Exception as e:
+            state.scratch.append(f"RESEARCH-BATCH-ERROR: {e} (retrying per query)")
+            per_query = None
+    if per_query is None:
+        per_query, timed_out = map_ordered(run_rag, all_queries, workers, q_timeout)
+    for i in timed_out:
+        state.scratch.append(f"RESEARCH-TIMEOUT: {all_queries[i]} (>{q_timeout:g}s)")
+
     ctx_all = []
-    for q in queries:
-        ctx_all.extend(run_rag(q))
-    ctx_all.extend(run_rag(state.task))  # baseline
+    for res in per_query:
+        ctx_all.extend(res or [])
 
     seen_urls = set()
     lines = []
@@ -127,6 +280,8 @@ Return as a JSON list of strings."""
             continue
         seen_urls.add(url)
         title = (c or {}).get("title") or url
+        if (c or {}).get("heading_path"):  # markdown-chunked collections: name the section too
+            title = f"{title} § {c['heading_path']}"
         snip  = ((c or {}).get("text") or "").replace("\n", " ").strip()
         if len(snip) > 240:
             snip = snip[:240].rstrip() + "…"
@@ -140,7 +295,7 @@ Return as a JSON list of strings."""
 
 def node_math(state: State) -> str:
     prompt = "Extract a single arithmetic expression from this task:\n" + state.task
-    expr = call_llm(prompt)
+    expr = call_llm(prompt, cache=True)
     expr = "".join(ch for ch in expr if ch in "0123456789+-*/().%^ ")
     try:
         val = safe_eval_math(expr)
@@ -169,7 +324,7 @@ Evidence:
 Notes:
 {chr(10).join(state.scratch[-5:])}
 Return a concise, structured answer."""
-    draft = call_llm(prompt, temperature=0.3)
+    draft = call_llm(prompt, temperature=0.3, stream=True)
     state.result = (draft or "").strip()
     state.scratch.append("DRAFT:\n" + state.result)
     return "critic"
@@ -182,7 +337,7 @@ Answer:
 {state.result}
 Criteria:
 {state.plan}"""
-    crit = (call_llm(prompt) or "").strip()
+    crit = (call_llm(prompt, stream=True) or "").strip()
     if crit.upper() != "OK" and len(crit) > 20:
         state.result = crit
         state.scratch.append("REVISED")
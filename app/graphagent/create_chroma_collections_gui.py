@@ -5,15 +5,20 @@
 
 from __future__ import annotations
 
-import os, sys, glob, hashlib, json, socket
-from pathlib import Path
-from datetime import datetime
+import os, threading
 from typing import Dict, List, Tuple
 
 import gradio as gr
 import chromadb
-import yaml
-from sentence_transformers import SentenceTransformer
+
+from app.graphagent.config import RAG_INGEST_WORKERS, RAG_DEDUP, RAG_DEDUP_DISTANCE
+from app.graphagent.dedup import DEDUP_MODES
+from app.graphagent.mmap_store import manifest_path, read_manifest
+from app.graphagent.ingest import (
+    read_markdown_with_frontmatter, sentence_chunks, ensure_semicolon_list, stable_doc_id,
+    build_embedder, embed_passages, staged_ingest, parse_annot_lines, write_collection_manifest,
+    ingest_collection, CHUNKERS,
+)
 
 # ---- Locate your external rag_core data dirs (same defaults as your scripts) ----
 RAG_HOME = os.environ.get("RAG_HOME", r"C:\Users\gmoores\Desktop\AI\RAG")
@@ -22,111 +27,32 @@ DEFAULT_MD_DIR = os.environ.get("RAG_MD_DIR", r"C:\Users\gmoores\Desktop\AI\RAG\
 DEFAULT_DB_DIR = os.environ.get("RAG_DB_DIR", r"C:\Users\gmoores\Desktop\AI\RAG\vector_store")
 DEFAULT_BASE   = os.environ.get("RAG_BASE", "markdown_chunks")
 
-# Optional NLTK sentence tokenizer (falls back to simple split if missing)
-try:
-    import nltk
-    try:
-        nltk.data.find("tokenizers/punkt")
-    except LookupError:
-        nltk.download("punkt")
-except Exception:
-    nltk = None
-
-
-# ---------------- Embedding helpers (mirrors your CLI script) ----------------
-
-def read_markdown_with_frontmatter(path: Path) -> Tuple[Dict, str]:
-    text = path.read_text(encoding="utf-8", errors="ignore")
-    if text.startswith("---\n"):
-        parts = text.split("\n---\n", 1)
-        if len(parts) == 2:
-            fm_raw = parts[0].replace("---\n", "")
-            body = parts[1]
-            try:
-                fm = yaml.safe_load(fm_raw) or {}
-            except Exception:
-                fm = {}
-            return fm, body
-    return {}, text
-
-def sentence_chunks(text: str, chunk_size: int, overlap_pct: float) -> List[str]:
-    overlap_chars = int(chunk_size * overlap_pct)
-    chunks: List[str] = []
-
-    if nltk is not None:
-        try:
-            sents = nltk.sent_tokenize(text)
-        except Exception:
-            sents = [text]
-    else:
-        sents = [s.strip() for s in text.replace("\r", "").split(". ")]
-
-    buf = ""
-    for s in sents:
-        if not s:
-            continue
-        candidate = (buf + (" " if buf and not buf.endswith("\n") else "") + s) if buf else s
-        if len(candidate) <= chunk_size:
-            buf = candidate
-        else:
-            if buf:
-                chunks.append(buf.strip())
-            if chunks and overlap_chars > 0:
-                tail = chunks[-1][-overlap_chars:]
-                buf = (tail + " " + s).strip()
-            else:
-                buf = s
-    if buf:
-        chunks.append(buf.strip())
-    return [c for c in chunks if c]
-
-def ensure_semicolon_list(val) -> str:
-    if val is None:
-        return ""
-    if isinstance(val, list):
-        return "; ".join(str(x) for x in val)
-    return str(val)
-
-def stable_doc_id(canonical_url: str, file_path: Path) -> str:
-    if canonical_url:
-        return hashlib.sha1(canonical_url.encode("utf-8")).hexdigest()[:16]
-    return hashlib.sha1(str(file_path).encode("utf-8")).hexdigest()[:16]
-
-def build_embedder(model_name: str) -> SentenceTransformer:
-    return SentenceTransformer(model_name)
-
-def embed_passages(model: SentenceTransformer, texts: List[str], model_name: str):
-    lower = model_name.lower()
-    if "bge" in lower or "e5" in lower:
-        texts = [f"passage: {t}" for t in texts]
-    return model.encode(texts, normalize_embeddings=True, show_progress_bar=False, batch_size=64)
-
-def parse_annot_lines(lines: str) -> Dict[str, str]:
-    out: Dict[str, str] = {}
-    for raw in (lines or "").splitlines():
-        raw = raw.strip()
-        if not raw or raw.startswith("#"):
-            continue
-        if "=" in raw:
-            k, v = raw.split("=", 1)
-            out[k.strip()] = v.strip()
-    return out
-
-def write_collection_manifest(db_dir: str, collection_name: str, data: Dict):
-    mdir = os.path.join(db_dir, "_collections")
-    os.makedirs(mdir, exist_ok=True)
-    with open(os.path.join(mdir, f"{collection_name}.json"), "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def read_collection_manifest(db_dir: str, collection_name: str) -> Dict:
-    path = os.path.join(db_dir, "_collections", f"{collection_name}.json")
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+# ---------------- Inspect collections (new) ----------------
 
+def _collection_row(db_dir: str, base: str, name: str, man: Dict, count) -> Dict:
+    if name == base:
+        profile = "_legacy"
+    elif name.startswith(f"{base}_"):
+        profile = name[len(base) + 1:]
+    else:
+        # unrelated collection; show but mark unknown base
+        profile = "(unknown)"
+    return {
+        "profile": profile,
+        "collection": name,
+        "model_name": man.get("model_name", "(unknown)"),
+        "chunk_size": man.get("chunk_size", "(unknown)"),
+        "overlap": man.get("overlap", "(unknown)"),
+        "run_label": man.get("run_label", ""),
+        "annotations": man.get("annotations", {}),
+        "count": count,
+        "updated_at": man.get("updated_at", ""),
+        "manifest_path": manifest_path(db_dir, name),
+    }
 
-# ---------------- Inspect collections (new) ----------------
+def _sorted_rows(rows: List[Dict]) -> List[Dict]:
+    # Newest first if timestamps are there
+    return sorted(rows, key=lambda x: x.get("updated_at") or "", reverse=True)
 
 def load_collections_with_manifests(db_dir: str, base: str) -> List[Dict]:
     """
@@ -138,39 +64,56 @@ def load_collections_with_manifests(db_dir: str, base: str) -> List[Dict]:
     names = [c.name for c in client.list_collections()]
 
     rows: List[Dict] = []
-    prefix = f"{base}_"
-
     for name in names:
-        if name == base:
-            profile = "_legacy"
-        elif name.startswith(prefix):
-            profile = name[len(prefix):]
-        else:
-            # unrelated collection; show but mark unknown base
-            profile = "(unknown)"
-        man = read_collection_manifest(db_dir, name)
+        man = read_manifest(db_dir, name)
         # try to get count from Chroma even if manifest missing
         try:
             coll = client.get_collection(name)
             count = coll.count()
         except Exception:
             count = man.get("count")
+        rows.append(_collection_row(db_dir, base, name, man, count))
+    return _sorted_rows(rows)
 
-        rows.append({
-            "profile": profile,
-            "collection": name,
-            "model_name": man.get("model_name", "(unknown)"),
-            "chunk_size": man.get("chunk_size", "(unknown)"),
-            "overlap": man.get("overlap", "(unknown)"),
-            "run_label": man.get("run_label", ""),
-            "annotations": man.get("annotations", {}),
-            "count": count,
-            "updated_at": man.get("updated_at", ""),
-            "manifest_path": os.path.join(db_dir, "_collections", f"{name}.json"),
-        })
-    # Newest first if timestamps are there
-    rows.sort(key=lambda x: x.get("updated_at") or "", reverse=True)
-    return rows
+
+class CollectionCatalog:
+    """
+    Cached collection table per (db_dir, base). A full scan (client, list, count() and
+    manifest per collection) happens on first use and on explicit refresh only; an embed
+    run updates just the row of the collection it wrote.
+    """
+
+    def __init__(self):
+        self._rows: Dict[Tuple[str, str], Dict[str, Dict]] = {}
+        self._lock = threading.Lock()
+
+    def rows(self, db_dir: str, base: str, refresh: bool = False) -> List[Dict]:
+        key = (db_dir, base)
+        with self._lock:
+            cached = None if refresh else self._rows.get(key)
+        if cached is None:
+            cached = {r["collection"]: r for r in load_collections_with_manifests(db_dir, base)}
+            with self._lock:
+                self._rows[key] = cached
+        return _sorted_rows(list(cached.values()))
+
+    def update(self, db_dir: str, base: str, name: str, count=None) -> None:
+        """
+        Re-read one collection's manifest (count from the caller, else the manifest) and
+        insert or replace its row; a table not cached yet is scanned first.
+        """
+        key = (db_dir, base)
+        with self._lock:
+            cached = key in self._rows
+        if not cached:
+            self.rows(db_dir, base)
+        man = read_manifest(db_dir, name)
+        row = _collection_row(db_dir, base, name, man, man.get("count") if count is None else count)
+        with self._lock:
+            self._rows.setdefault(key, {})[name] = row
+
+
+CATALOG = CollectionCatalog()
 
 def rows_to_table(rows: List[Dict]) -> List[List]:
     cols = ["profile", "collection", "model_name", "chunk_size", "overlap", "run_label", "annotations", "count", "updated_at", "manifest_path"]
@@ -180,7 +123,15 @@ def rows_to_table(rows: List[Dict]) -> List[List]:
     return table
 
 
-# ---------------- Embedding core (yields progress updates) ----------------
+def _cached_table(db_dir: str, base: str) -> List[List]:
+    """Catalog table for error paths; empty when db_dir can't be scanned."""
+    try:
+        return rows_to_table(CATALOG.rows(db_dir, base))
+    except Exception:
+        return []
+
+
+# ---------------- Embedding core (ingest.ingest_collection; this adapts its events to the UI) ----------------
 
 def run_embed(
     md_dir: str,
@@ -193,6 +144,10 @@ def run_embed(
     batch: int,
     run_label: str,
     annotations_text: str,
+    incremental: bool = True,
+    chunker: str = "sentence",
+    dedup: str = "off",
+    dedup_distance: int = 6,
     progress: gr.Progress = gr.Progress(track_tqdm=False),
 ):
     log_lines: List[str] = []
@@ -201,115 +156,38 @@ def run_embed(
         log_lines.append(msg)
         return "\n".join(log_lines[-500:])
 
-    if not os.path.isdir(md_dir):
-        yield ("❌ Markdown folder not found.", "", 0, 0, "", [])
-        return
-    if not os.path.isdir(db_dir):
-        os.makedirs(db_dir, exist_ok=True)
-
-    collection_name = f"{base}_{profile}"
-    client = chromadb.PersistentClient(path=db_dir)
-    try:
-        coll = client.create_collection(collection_name, metadata={"profile": profile})
-    except Exception:
-        coll = client.get_collection(collection_name)
-
-    log(f"🔧 Loading embedder: {model_name}")
-    model = build_embedder(model_name)
-
-    md_files = glob.glob(os.path.join(md_dir, "**", "*.md"), recursive=True)
-    total_files = len(md_files)
-    if total_files == 0:
-        yield ("❌ No .md files found in md_dir.", collection_name, 0, 0, "", rows_to_table(load_collections_with_manifests(db_dir, base)))
-        return
-
-    ids_batch: List[str] = []
-    docs_batch: List[str] = []
-    metas_batch: List[Dict] = []
-    total_chunks = 0
-
-    annots = parse_annot_lines(annotations_text)
-
-    yield (log(f"📁 Files to process: {total_files}"), collection_name, 0, total_files, "", rows_to_table(load_collections_with_manifests(db_dir, base)))
-
-    for idx, fp in enumerate(md_files, 1):
-        progress(idx / total_files)
-
-        p = Path(fp)
-        fm, body = read_markdown_with_frontmatter(p)
-        title = str(fm.get("title") or p.stem)
-        canonical_url = str(fm.get("url") or "")
-        tags = ensure_semicolon_list(fm.get("tags"))
-        doc_id = stable_doc_id(canonical_url, p)
-
-        chunks = sentence_chunks(body, chunk_size, overlap)
-        for i, ch in enumerate(chunks):
-            chunk_id = f"{doc_id}#c{i:05d}"
-            meta = {
-                "title": title,
-                "canonical_url": canonical_url,
-                "tags": tags,
-                "source_path": str(p),
-                "doc_id": doc_id,
-                "chunk_index": i,
-                "profile": profile,
-                "model_name": model_name,
-                "chunk_size": chunk_size,
-                "overlap": overlap,
-                "run_label": run_label,
-            }
-            meta.update(annots)
-
-            ids_batch.append(chunk_id)
-            docs_batch.append(ch)
-            metas_batch.append(meta)
-
-            if len(docs_batch) >= batch:
-                embs = embed_passages(model, docs_batch, model_name)
-                coll.add(ids=ids_batch, documents=docs_batch, metadatas=metas_batch, embeddings=embs)
-                total_chunks += len(docs_batch)
-                ids_batch, docs_batch, metas_batch = [], [], []
-
-        if idx % 20 == 0 or idx == total_files:
-            yield (log(f"📦 Processed {idx}/{total_files} files… (chunks so far: {total_chunks})"),
-                   collection_name, idx, total_files, "", rows_to_table(load_collections_with_manifests(db_dir, base)))
-
-    if docs_batch:
-        embs = embed_passages(model, docs_batch, model_name)
-        coll.add(ids=ids_batch, documents=docs_batch, metadatas=metas_batch, embeddings=embs)
-        total_chunks += len(docs_batch)
-
-    # Manifest write/refresh
-    manifest = {
-        "collection": collection_name,
-        "base": base,
-        "profile": profile,
-        "model_name": model_name,
-        "chunk_size": chunk_size,
-        "overlap": overlap,
-        "run_label": run_label,
-        "annotations": annots,
-        "db_dir": db_dir,
-        "md_dir": md_dir,
-        "host": socket.gethostname(),
-        "updated_at": datetime.utcnow().isoformat() + "Z",
-        "count": coll.count(),
-    }
-    mdir = os.path.join(db_dir, "_collections")
-    os.makedirs(mdir, exist_ok=True)
-    mpath = os.path.join(mdir, f"{collection_name}.json")
-    with open(mpath, "w", encoding="utf-8") as f:
-        json.dump(manifest, f, ensure_ascii=False, indent=2)
-
-    yield (log(f"✅ Done. Collection '{collection_name}' now has {coll.count()} items.\nManifest: {mpath}"),
-           collection_name, total_files, total_files, mpath, rows_to_table(load_collections_with_manifests(db_dir, base)))
+    collection_name, total_files = "", 0
+    for ev in ingest_collection(md_dir, db_dir, base, profile, model_name, chunk_size, overlap, batch=batch,
+                                run_label=run_label, annotations=parse_annot_lines(annotations_text),
+                                incremental=incremental, workers=RAG_INGEST_WORKERS, chunker=chunker,
+                                dedup=dedup, dedup_distance=int(dedup_distance)):
+        kind = ev["event"]
+        if kind == "error":
+            yield (f"❌ {ev['message']}", collection_name, 0, 0, "", _cached_table(db_dir, base))
+            return
+        if kind == "log":
+            log(ev["message"])
+        elif kind == "start":
+            collection_name, total_files = ev["collection"], ev["files_total"]
+            CATALOG.update(db_dir, base, collection_name)  # new collections show up while they are written
+        elif kind == "progress":
+            total_files = ev["files_total"]  # grows when dedup re-ingests orphaned duplicates
+            progress(ev["files_done"] / total_files)
+            CATALOG.update(db_dir, base, collection_name, count=ev["count"])
+            yield (log(f"📦 Processed {ev['files_done']}/{total_files} files… (chunks written: {ev['chunks_written']}, batch {ev['batch_size']})"),
+                   collection_name, ev["files_done"], total_files, "", rows_to_table(CATALOG.rows(db_dir, base)))
+        elif kind == "done":
+            CATALOG.update(db_dir, base, collection_name, count=ev["count"])
+            yield (log(f"✅ Done. Collection '{collection_name}' now has {ev['count']} items.\nManifest: {ev['manifest_path']}"),
+                   collection_name, total_files, total_files, ev["manifest_path"],
+                   rows_to_table(CATALOG.rows(db_dir, base)))
 
 
 # ---------------- Utility to list collections ----------------
 
 def list_collections(db_dir: str, base: str):
-    rows = load_collections_with_manifests(db_dir, base)
-    return rows_to_table(rows)
+    """Refresh buttons: full rescan of db_dir."""
+    return rows_to_table(CATALOG.rows(db_dir, base, refresh=True))
 
 
 # ---------------- Build the GUI ----------------
@@ -336,9 +214,14 @@ def build_ui():
                     label="Embedding model"
                 )
             with gr.Row():
-                chunk_size = gr.Slider(300, 1200, value=650, step=10, label="Chunk size (chars)")
+                chunker = gr.Dropdown(choices=list(CHUNKERS), value="sentence", label="Chunker")
+                chunk_size = gr.Slider(100, 1200, value=650, step=10, label="Chunk size (chars; tokens for markdown)")
                 overlap = gr.Slider(0.0, 0.30, value=0.15, step=0.01, label="Overlap (ratio)")
                 batch = gr.Slider(8, 256, value=64, step=8, label="Batch add size")
+                incremental = gr.Checkbox(value=True, label="Incremental (skip unchanged files)")
+            with gr.Row():
+                dedup = gr.Dropdown(choices=list(DEDUP_MODES), value=RAG_DEDUP, label="Near-duplicate chunks")
+                dedup_distance = gr.Slider(0, 16, value=RAG_DEDUP_DISTANCE, step=1, label="Dedup distance (SimHash bits)")
             run_label = gr.Textbox(value="BGE v1.5 / 650c / 15% overlap", label="Run label (free text)")
             annotations = gr.Textbox(
                 value="corpus=wordpress\nnotes=first_run",
@@ -367,7 +250,7 @@ def build_ui():
 
             start.click(
                 fn=run_embed,
-                inputs=[md_dir, db_dir, base, profile, model, chunk_size, overlap, batch, run_label, annotations],
+                inputs=[md_dir, db_dir, base, profile, model, chunk_size, overlap, batch, run_label, annotations, incremental, chunker, dedup, dedup_distance],
                 outputs=[log_md, coll_out, prog_now, prog_total, manifest_out, collist_create],
                 show_progress=True,
                 queue=True,  # enable streaming yields
@@ -0,0 +1,151 @@
+# app/graphagent/dag.py
+from __future__ import annotations
+
+import asyncio
+import copy
+from dataclasses import fields
+from typing import Any, Callable, Dict, List, Tuple
+
+from .core import State, planned_tools
+from .llm_client import token_sink
+from .tracing import span
+
+NodeFn = Callable[[State], str]
+TERMINALS = ("", "end", "done", "stop")
+
+
+def normalize_edges(raw: Any) -> Tuple[str | None, Dict[str, List[str]]]:
+    """
+    Accept both edge styles used in this repo and return (start, adjacency):
+      pipelines/*.yaml: {"plan": ["route"], "route": ["research", "math", "write"], ...}
+      flows/*.yaml:     [{"from": "start", "to": "plan"}, {"from": "plan", "to": "route"}, ...]
+    A 'start' pseudo-node (flows style) becomes the returned start name.
+    """
+    adj: Dict[str, List[str]] = {}
+    if isinstance(raw, dict):
+        for src, dsts in raw.items():
+            adj[str(src)] = [str(d) for d in (dsts if isinstance(dsts, list) else [dsts])]
+    else:
+        for e in raw or []:
+            adj.setdefault(str(e["from"]), []).append(str(e["to"]))
+    start = None
+    if "start" in adj:
+        start = adj.pop("start")[0]
+    return start, adj
+
+
+def fanout_groups(edges: Dict[str, List[str]]) -> Dict[str, Tuple[List[str], str]]:
+    """
+    Decision nodes that can be replaced by a parallel fan-out:
+    node -> (branches, join), where branches are successors whose only edge leads
+    back to the node (route -> research -> route) and join is the single remaining
+    successor (route -> write). Nodes that don't fit this shape are left alone.
+    """
+    groups: Dict[str, Tuple[List[str], str]] = {}
+    for node, succ in edges.items():
+        if len(succ) < 2:
+            continue
+        branches = [s for s in succ if edges.get(s) == [node]]
+        joins = [s for s in succ if s not in branches]
+        if branches and len(joins) == 1:
+            groups[node] = (branches, joins[0])
+    return groups
+
+
+def merge_states(base: State, branches: List[State]) -> State:
+    """
+    Fold branch copies back into base, in branch order (deterministic):
+    list fields get each branch's appended items; other fields take the branch
+    value when it changed (a later branch wins on conflict); step counts add up.
+    """
+    snapshot = copy.deepcopy(base)
+    for b in branches:
+        for f in fields(base):
+            before = getattr(snapshot, f.name)
+            after = getattr(b, f.name)
+            if f.name == "step":
+                base.step += after - before
+            elif isinstance(before, list):
+                getattr(base, f.name).extend(after[len(before):])
+            elif after != before:
+                setattr(base, f.name, after)
+    return base
+
+
+def _run_node(fn: NodeFn, state: State, name: str, on_token: Callable[[str, str], None] | None) -> str:
+    state.visited.append(name)
+    sink = (lambda t: on_token(name, t)) if on_token else None
+    with token_sink(sink), span(name, "node", step=state.step) as rec:
+        rec["next"] = (fn(state) or "").strip().lower()
+        return rec["next"]
+
+
+async def arun_dag(
+    task: str,
+    spec: Dict[str, Any],
+    max_steps: int = 50,
+    select: Callable[[State], List[str] | None] = planned_tools,
+    on_node: Callable[[str], None] | None = None,
+    on_token: Callable[[str, str], None] | None = None,
+    state: State | None = None,
+    start: str | None = None,
+    after_node: Callable[[State, str, str], None] | None = None,
+) -> State:
+    """
+    Execute spec as a DAG. Linear nodes run one at a time; at a fan-out node
+    (see fanout_groups) the branches chosen by select(state) run concurrently on
+    copies of the state, are merged in edge order and joined before the join node.
+    If select() returns None the decision node itself runs (sequential behaviour).
+    state/start resume a checkpointed run; after_node(state, node, next) fires
+    after each node and after each joined fan-out.
+    """
+    nodes: Dict[str, NodeFn] = spec["nodes"]
+    spec_start, edges = normalize_edges(spec.get("edges") or {})
+    groups = fanout_groups(edges)
+    current = start or spec.get("start") or spec_start or "plan"
+    state = state if state is not None else State(task=task)
+
+    while not state.done and state.step < max_steps and current not in TERMINALS:
+        if current in groups:
+            branches, join = groups[current]
+            wanted = select(state)
+            if wanted is not None:
+                chosen = [b for b in branches if b in wanted]
+                # same entries node_route logs when it walks the branches one by one
+                state.route_log.extend(f"rule: {b}" for b in chosen + [join])
+                copies = [copy.deepcopy(state) for _ in chosen]
+                if on_node:
+                    for b in chosen:
+                        on_node(b)
+                await asyncio.gather(*(
+                    asyncio.to_thread(_run_node, nodes[b], st, b, on_token)
+                    for b, st in zip(chosen, copies)
+                ))
+                for st in copies:
+                    st.step += 1
+                merge_states(state, copies)
+                if after_node:
+                    after_node(state, current, join)
+                current = join
+                continue
+
+        fn = nodes.get(current)
+        if fn is None:
+            raise RuntimeError(f"Unknown node '{current}' in pipeline.")
+        if on_node:
+            on_node(current)
+        next_name = await asyncio.to_thread(_run_node, fn, state, current, on_token)
+        state.step += 1
+
+        succ = edges.get(current)
+        if not (next_name in TERMINALS or not succ or next_name in succ):
+            next_name = succ[0]  # node returned a name the spec doesn't allow here
+        if after_node:
+            after_node(state, current, next_name or "end")
+        current = next_name
+    return state
+
+
+def run_dag(task: str, spec: Dict[str, Any], max_steps: int = 50, **kwargs) -> State:
+    """Blocking wrapper over arun_dag."""
+    return asyncio.run(arun_dag(task, spec, max_steps=max_steps, **kwargs))
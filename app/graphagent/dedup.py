@@ -0,0 +1,120 @@
+# app/graphagent/dedup.py
+# Near-duplicate chunk detection for ingest: 64-bit SimHash over word shingles,
+# with block-combination lookup tables so finding a match within max_distance bits is a few
+# dict probes instead of a scan. Boilerplate (footers, disclaimers, related-posts
+# blocks) repeated across a WordPress-style corpus collapses onto one surviving chunk.
+from __future__ import annotations
+
+import hashlib
+import re
+from itertools import combinations
+from math import comb
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+DEDUP_MODES = ("off", "drop", "link")
+_WORD = re.compile(r"\w+")
+_MASK = (1 << 64) - 1
+
+
+def simhash(text: str, shingle: int = 3) -> Tuple[int, int]:
+    """(64-bit fingerprint, token count) of lower-cased word shingles."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return 0, 0
+    grams = [" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    digests = b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)  # (n, 64), MSB first
+    votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(grams)
+    return int.from_bytes(np.packbits(votes > 0).tobytes(), "big"), len(words)
+
+
+def to_signed(fp: int) -> int:
+    """SQLite INTEGER is signed 64-bit."""
+    return fp - (1 << 64) if fp >= 1 << 63 else fp
+
+
+def to_unsigned(v: int) -> int:
+    return v & _MASK
+
+
+def _block_layout(max_distance: int, key_bits: int, max_tables: int) -> Tuple[int, int]:
+    """
+    (blocks, agree): split 64 bits into `blocks` blocks; fingerprints within max_distance
+    bits still agree exactly on `agree` = blocks - max_distance of them. Pick the fewest
+    blocks whose shortest key (agree blocks) is >= key_bits, within max_tables tables.
+    """
+    best = (max_distance + 1, 1)
+    for g in range(max_distance + 1, 65):
+        if g > max_distance + 1 and comb(g, g - max_distance) > max_tables:
+            break
+        best = (g, g - max_distance)
+        if best[1] * (64 // g) >= key_bits:
+            break
+    return best
+
+
+class SimHashIndex:
+    """
+    chunk id -> fingerprint, looked up by Hamming distance <= max_distance.
+    The 64 bits are split into blocks; a match within max_distance bits agrees exactly on
+    at least blocks - max_distance of them (pigeonhole), so there is one table per such
+    block combination and only candidates sharing a key are compared bit by bit.
+    Keys are ~key_bits wide so buckets stay at ~n / 2**key_bits entries: max_distance=6 is
+    8 blocks of 8 bits, 28 tables of 16-bit keys, instead of 7 bands of 9 bits (n / 512
+    per bucket, O(n^2 / 512) compares over an ingest). Each chunk costs one list slot per table.
+    """
+
+    def __init__(self, max_distance: int = 3, key_bits: int = 16, max_tables: int = 32):
+        self.max_distance = min(63, max(0, int(max_distance)))
+        self.blocks, agree = _block_layout(self.max_distance, key_bits, max_tables)
+        widths = [64 // self.blocks + (1 if i < 64 % self.blocks else 0) for i in range(self.blocks)]
+        self._spans = [(sum(widths[:i]), (1 << w) - 1, w) for i, w in enumerate(widths)]  # (shift, mask, width)
+        self._combos = list(combinations(range(self.blocks), agree))
+        self._tables: List[Dict[int, List[str]]] = [{} for _ in self._combos]
+        self._fps: Dict[str, int] = {}
+
+    def _keys(self, fp: int) -> List[int]:
+        parts = [((fp >> shift) & mask, w) for shift, mask, w in self._spans]
+        keys = []
+        for combo in self._combos:
+            key = 0
+            for i in combo:
+                key = (key << parts[i][1]) | parts[i][0]
+            keys.append(key)
+        return keys
+
+    def __len__(self) -> int:
+        return len(self._fps)
+
+    def add(self, chunk_id: str, fp: int) -> None:
+        self.remove(chunk_id)
+        self._fps[chunk_id] = fp
+        for table, key in zip(self._tables, self._keys(fp)):
+            table.setdefault(key, []).append(chunk_id)
+
+    def remove(self, chunk_id: str) -> None:
+        fp = self._fps.pop(chunk_id, None)
+        if fp is None:
+            return
+        for table, key in zip(self._tables, self._keys(fp)):
+            ids = table.get(key)
+            if ids is not None and chunk_id in ids:
+                ids.remove(chunk_id)
+                if not ids:
+                    del table[key]
+
+    def find(self, fp: int) -> str | None:
+        """Closest indexed chunk within max_distance (ties: smallest id), or None."""
+        best: Tuple[int, str] | None = None
+        seen: Set[str] = set()
+        for table, key in zip(self._tables, self._keys(fp)):
+            for cid in table.get(key, ()):
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                d = bin(self._fps[cid] ^ fp).count("1")
+                if d <= self.max_distance and (best is None or (d, cid) < best):
+                    best = (d, cid)
+        return best[1] if best else None
@@ -0,0 +1,85 @@
+# app/graphagent/embed_cache.py
+# Persistent passage-embedding cache shared by every profile/run in a db_dir:
+# key (model_name, sha256(prefix + chunk text)) -> float16 vector. A new profile
+# that only changes overlap, or a re-run after an interrupted one, re-encodes
+# just the chunk texts the model has not seen.
+# Stored at <db_dir>/_collections/_embeddings.sqlite unless RAG_EMBED_CACHE_PATH is set.
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def embed_cache_path(db_dir: str) -> str:
+    return os.path.join(db_dir, "_collections", "_embeddings.sqlite")
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite table (model, sha256) -> float16 blob. Thread-safe (one connection behind a lock).
+    Counts hits/misses for the run's hit-rate report.
+    """
+
+    _IN_CHUNK = 500  # keys per SELECT ... IN (...)
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, key TEXT NOT NULL, dim INTEGER NOT NULL, vec BLOB NOT NULL, created REAL NOT NULL,"
+            " PRIMARY KEY (model, key))"
+        )
+        self._db.commit()
+        self.hits = self.misses = 0
+
+    def get_many(self, model_name: str, keys: List[str]) -> Dict[str, np.ndarray]:
+        out: Dict[str, np.ndarray] = {}
+        uniq = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(uniq), self._IN_CHUNK):
+                part = uniq[i:i + self._IN_CHUNK]
+                rows = self._db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                    [model_name, *part],
+                ).fetchall()
+                for k, blob in rows:
+                    out[k] = np.frombuffer(blob, dtype=np.float16)
+            found = sum(1 for k in keys if k in out)
+            self.hits += found
+            self.misses += len(keys) - found
+        return out
+
+    def put_many(self, model_name: str, keys: List[str], vecs: np.ndarray) -> None:
+        now = time.time()
+        v16 = np.asarray(vecs, dtype=np.float16)
+        rows = [(model_name, k, int(v16.shape[1]), v16[i].tobytes(), now) for i, k in enumerate(keys)]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "path": self.path,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,155 @@
+# app/graphagent/file_index.py
+# Per-collection record of which source files are embedded, so run_embed can
+# skip unchanged files, upsert changed ones and delete chunks of removed ones.
+# Stored next to the manifest: <db_dir>/_collections/<collection>.files.sqlite
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+def file_index_path(db_dir: str, collection_name: str) -> str:
+    return os.path.join(db_dir, "_collections", f"{collection_name}.files.sqlite")
+
+
+def file_sha256(path: str, bufsize: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(bufsize), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class FileIndex:
+    """
+    SQLite table path -> (sha256, mtime, size, chunk ids, run id) plus the embedding
+    parameters the rows were produced with, the state of the last ingest run and the
+    chunks' near-duplicate fingerprints. Safe to share between the ingest threads
+    (one connection behind a lock).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, sha256 TEXT NOT NULL, mtime REAL NOT NULL, size INTEGER NOT NULL,"
+            " chunk_ids TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS params (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS run (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            " chunk_id TEXT PRIMARY KEY, fp INTEGER NOT NULL, dup_of TEXT NOT NULL DEFAULT '')"
+        )
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(files)")}
+        if "run_id" not in cols:  # sidecars written before resumable runs
+            self._db.execute("ALTER TABLE files ADD COLUMN run_id TEXT NOT NULL DEFAULT ''")
+        self._db.commit()
+
+    # --- parameters (model, chunking); a change means every file must be re-embedded ---
+    def params(self) -> Dict[str, Any]:
+        with self._lock:
+            return {k: json.loads(v) for k, v in self._db.execute("SELECT key, value FROM params")}
+
+    def set_params(self, params: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM params")
+            self._db.executemany("INSERT INTO params VALUES (?, ?)", [(k, json.dumps(v)) for k, v in params.items()])
+            self._db.commit()
+
+    # --- run checkpoint: files committed under the current run_id are done ---
+    def run_state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {k: json.loads(v) for k, v in self._db.execute("SELECT key, value FROM run")}
+
+    def begin_run(self, params: Dict[str, Any], full: bool, resume: bool = True) -> Tuple[str, bool]:
+        """
+        (run_id, resumed). An unfinished run with the same params and mode is
+        resumed when resume=True; otherwise a new run starts.
+        """
+        prev = self.run_state()
+        if resume and prev.get("status") == "running" and prev.get("params") == params and prev.get("full") == full:
+            return prev["run_id"], True
+        run = {"run_id": uuid.uuid4().hex[:12], "params": params, "full": full,
+               "status": "running", "started_at": time.time()}
+        self._set_run(run)
+        return run["run_id"], False
+
+    def finish_run(self, summary: Dict[str, Any] | None = None) -> None:
+        run = self.run_state()
+        run.update(status="done", finished_at=time.time(), summary=summary or {})
+        self._set_run(run)
+
+    def _set_run(self, run: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM run")
+            self._db.executemany("INSERT INTO run VALUES (?, ?)", [(k, json.dumps(v)) for k, v in run.items()])
+            self._db.commit()
+
+    # --- files ---
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT path, sha256, mtime, size, chunk_ids, run_id FROM files").fetchall()
+        return {
+            p: {"sha256": h, "mtime": m, "size": s, "chunk_ids": json.loads(c), "run_id": r}
+            for p, h, m, s, c, r in rows
+        }
+
+    def put_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        now = time.time()
+        rows = [(r["path"], r["sha256"], r["mtime"], r["size"], json.dumps(r["chunk_ids"]), now, r.get("run_id", ""))
+                for r in records]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files (path, sha256, mtime, size, chunk_ids, updated, run_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    # --- near-duplicate fingerprints (dedup.py): dup_of = "" for surviving chunks ---
+    def fingerprints(self) -> Dict[str, Tuple[int, str]]:
+        with self._lock:
+            return {c: (fp, d) for c, fp, d in self._db.execute("SELECT chunk_id, fp, dup_of FROM fingerprints")}
+
+    def put_fingerprints(self, rows: Iterable[Tuple[str, int, str]]) -> None:
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)", list(rows))
+            self._db.commit()
+
+    def remove_fingerprints(self, chunk_ids: List[str]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM fingerprints WHERE chunk_id = ?", [(c,) for c in chunk_ids])
+            self._db.commit()
+
+    def duplicate_summary(self, top: int = 20) -> Dict[str, Any]:
+        """Totals plus the surviving chunk ids with the most duplicates collapsed onto them."""
+        with self._lock:
+            total = self._db.execute("SELECT COUNT(*) FROM fingerprints WHERE dup_of != ''").fetchone()[0]
+            rows = self._db.execute(
+                "SELECT dup_of, COUNT(*) AS n FROM fingerprints WHERE dup_of != ''"
+                " GROUP BY dup_of ORDER BY n DESC, dup_of LIMIT ?", (top,)).fetchall()
+            survivors = self._db.execute("SELECT COUNT(DISTINCT dup_of) FROM fingerprints WHERE dup_of != ''").fetchone()[0]
+        return {"duplicates": total, "survivors_with_duplicates": survivors, "top": [[c, n] for c, n in rows]}
+
+    def touch(self, path: str, mtime: float, size: int) -> None:
+        """Content unchanged but the file was rewritten: remember the new stat."""
+        with self._lock:
+            self._db.execute("UPDATE files SET mtime = ?, size = ?, updated = ? WHERE path = ?", (mtime, size, time.time(), path))
+            self._db.commit()
+
+    def remove_many(self, paths: List[str]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -1,6 +1,7 @@
 import yaml
 from pathlib import Path
 from . import core
+from .tracing import span
 
 NODE_MAP = {
     "plan": core.node_plan,
@@ -24,11 +25,29 @@ class FlowRunner:
             lines.append(f"{edge['from']} -> {edge['to']}")
         return "\n".join(lines)
 
-    def run(self, task: str):
-        """Run the graph dynamically using the YAML definition."""
+    def run(self, task: str, mode: str = "sequential", checkpoint=None, run_id: str | None = None):
+        """Run the graph dynamically using the YAML definition.
+        mode="dag" runs independent branches (e.g. research + math) in parallel.
+        checkpoint (CheckpointStore) + run_id snapshot after each node and resume
+        from the last completed node when run_id already has snapshots.
+        """
         state = core.State(task=task)
         cur = "plan"
         max_steps = 12
+        save = None
+        if checkpoint is not None and run_id:
+            saved = checkpoint.load(run_id)
+            if saved:
+                state, cur = saved
+            save = lambda st, node, nxt: checkpoint.save(run_id, st, node, nxt)
+        if cur == "end":
+            return state
+
+        if mode == "dag":
+            from .dag import normalize_edges, run_dag
+            start, edges = normalize_edges(self.flow.get("edges", []))
+            spec = {"start": start or "plan", "nodes": NODE_MAP, "edges": edges}
+            return run_dag(task, spec, max_steps=max_steps, state=state, start=cur, after_node=save)
 
         while not state.done and state.step < max_steps:
             state.step += 1
@@ -42,8 +61,14 @@ class FlowRunner:
                 continue
 
             try:
-                nxt = NODE_MAP[cur](state)
+                state.visited.append(cur)
+                with span(cur, "node", step=state.step) as rec:
+                    nxt = NODE_MAP[cur](state)
+                    rec["next"] = nxt
+                if save:
+                    save(state, cur, nxt)
             except Exception as e:
+                # no snapshot: a resume retries this node from the last good one
                 state.scratch.append(f"[ERROR] Exception in {cur}: {e}")
                 nxt = "end"
 
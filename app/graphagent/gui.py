@@ -170,7 +170,11 @@ class GraphAgentGUI(tk.Tk):
                 self.model_var.set(os.environ.get("LLM_MODEL", ""))
 
                 spec = load_pipeline(pipeline_name)
-                state = run_pipeline(task, spec)
+                state = run_pipeline(
+                    task, spec,
+                    on_node=lambda n: self.after(0, self._on_node, n),
+                    on_token=lambda n, t: self.after(0, self._on_token, n, t),
+                )
 
                 # push outputs back to UI thread
                 self.after(0, lambda: self._render_outputs(spec, state))
@@ -189,6 +193,22 @@ class GraphAgentGUI(tk.Tk):
 
         threading.Thread(target=_worker, daemon=True).start()
 
+    # streaming hooks (run on the UI thread)
+    def _on_node(self, node: str):
+        self.status_var.set(f"Running… ({node})")
+        if node == "write":
+            self.set_text(self.result_txt, "")
+            self.nb.select(self.result_txt.master)
+
+    def _on_token(self, node: str, text: str):
+        # show the draft live; the final (possibly critic-revised) result replaces it
+        if node != "write":
+            return
+        self.result_txt.config(state="normal")
+        self.result_txt.insert("end", text)
+        self.result_txt.see("end")
+        self.result_txt.config(state="disabled")
+
     def _render_outputs(self, spec, state):
         self.set_text(self.result_txt, state.result or "(no result)")
         self.set_text(self.evidence_txt, "\n".join(str(e) for e in state.evidence) or "(no evidence)")
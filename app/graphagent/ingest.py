@@ -0,0 +1,788 @@
+# app/graphagent/ingest.py
+# Markdown -> chunks -> embeddings -> Chroma, as a staged pipeline:
+#
+#   parse  : process pool, one task per file (stat/hash check, front-matter, chunking)
+#   embed  : one thread owning the model; dynamic batch size over a bounded chunk queue
+#   write  : one thread doing Chroma upserts/deletes and committing file records
+#
+# Bounded queues between the stages give backpressure: parsing stalls when the
+# embedder falls behind, the embedder stalls when Chroma writes do.
+#
+# ingest_collection wraps the pipeline with everything else a run needs (Chroma
+# collection, file index + run checkpoint, manifest, mmap/ANN export) and yields
+# plain-dict events, so the Gradio GUI and the headless CLI share one code path:
+#
+#   python -m app.graphagent.ingest --md-dir ... --db-dir ... --profile bge_s650_o15
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import yaml
+
+from .config import (
+    RAG_BASE, RAG_DB_DIR, RAG_DEDUP, RAG_DEDUP_DISTANCE, RAG_EMBED_CACHE, RAG_EMBED_CACHE_PATH, RAG_INGEST_WORKERS,
+    RAG_MD_DIR, RAG_MMAP, RAG_MMAP_DTYPE, RAG_QUANT,
+)
+from .file_index import FileIndex, file_index_path, file_sha256
+from .dedup import DEDUP_MODES, SimHashIndex, simhash, to_signed, to_unsigned
+from .md_chunks import TOKEN_RESERVE, markdown_chunks, token_counter
+from .mmap_store import write_manifest
+
+# Optional NLTK sentence tokenizer (falls back to simple split if missing)
+try:
+    import nltk
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        nltk.download("punkt")
+except Exception:
+    nltk = None
+
+
+# ---------------- Embedding helpers (mirrors your CLI script) ----------------
+
+def read_markdown_with_frontmatter(path: Path) -> Tuple[Dict, str]:
+    text = path.read_text(encoding="utf-8", errors="ignore")
+    if text.startswith("---\n"):
+        parts = text.split("\n---\n", 1)
+        if len(parts) == 2:
+            fm_raw = parts[0].replace("---\n", "")
+            body = parts[1]
+            try:
+                fm = yaml.safe_load(fm_raw) or {}
+            except Exception:
+                fm = {}
+            return fm, body
+    return {}, text
+
+def split_sentences(text: str) -> List[str]:
+    if nltk is not None:
+        try:
+            return nltk.sent_tokenize(text)
+        except Exception:
+            return [text]
+    return [s.strip() for s in text.replace("\r", "").split(". ")]
+
+def pack_sentences(sents: Iterable[str], chunk_size: int, overlap_chars: int) -> List[str]:
+    """
+    Greedy sentence packing: sentences joined by " " (nothing after a newline) up to
+    chunk_size chars; a new chunk starts with the last overlap_chars of the previous one.
+    The fit is decided on lengths and the open chunk grows with in-place `+=`, so no
+    candidate string is built for every sentence.
+    """
+    chunks: List[str] = []
+    buf = ""
+    for s in sents:
+        if not s:
+            continue
+        if buf:
+            sep = "" if buf[-1] == "\n" else " "
+            if len(buf) + len(sep) + len(s) <= chunk_size:
+                buf += sep
+                buf += s
+                continue
+            chunks.append(buf.strip())
+        elif len(s) <= chunk_size:
+            buf = s
+            continue
+        buf = (chunks[-1][-overlap_chars:] + " " + s).strip() if chunks and overlap_chars > 0 else s
+    if buf:
+        chunks.append(buf.strip())
+    return [c for c in chunks if c]
+
+def sentence_chunks(text: str, chunk_size: int, overlap_pct: float) -> List[str]:
+    return pack_sentences(split_sentences(text), chunk_size, int(chunk_size * overlap_pct))
+
+CHUNKERS = ("sentence", "markdown")
+
+def markdown_token_budget(chunk_size: int, model_name: str) -> int:
+    """Markdown chunker size: chunk_size tokens, capped to what the embedder will actually read."""
+    _, window = token_counter(model_name)
+    return max(16, min(int(chunk_size), window - TOKEN_RESERVE))
+
+def chunk_body(body: str, chunker: str, chunk_size: int, overlap: float, model_name: str) -> List[Tuple[str, str]]:
+    """[(chunk text, heading path)]; "sentence" sizes in chars (no heading path), "markdown" in tokens."""
+    if chunker == "markdown":
+        count, _ = token_counter(model_name)
+        return markdown_chunks(body, markdown_token_budget(chunk_size, model_name), overlap, count,
+                               sentences=split_sentences)
+    if chunker != "sentence":
+        raise ValueError(f"unknown chunker {chunker!r} (expected one of {CHUNKERS})")
+    return [(c, "") for c in sentence_chunks(body, chunk_size, overlap)]
+
+def ensure_semicolon_list(val) -> str:
+    if val is None:
+        return ""
+    if isinstance(val, list):
+        return "; ".join(str(x) for x in val)
+    return str(val)
+
+def stable_doc_id(canonical_url: str, file_path: Path) -> str:
+    if canonical_url:
+        return hashlib.sha1(canonical_url.encode("utf-8")).hexdigest()[:16]
+    return hashlib.sha1(str(file_path).encode("utf-8")).hexdigest()[:16]
+
+def build_embedder(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def embed_passages(model, texts: List[str], model_name: str, batch_size: int = 64, cache=None):
+    """
+    Normalised passage embeddings. With an embed_cache.EmbeddingCache, vectors for
+    (model_name, sha256(prefix + text)) already stored are reused and only misses are encoded.
+    """
+    lower = model_name.lower()
+    if "bge" in lower or "e5" in lower:
+        texts = [f"passage: {t}" for t in texts]
+    if cache is None:
+        return model.encode(texts, normalize_embeddings=True, show_progress_bar=False, batch_size=batch_size)
+
+    import numpy as np
+    from .embed_cache import text_key
+    keys = [text_key(t) for t in texts]
+    found = cache.get_many(model_name, keys)
+    todo = list(dict.fromkeys(k for k in keys if k not in found))  # duplicate texts are encoded once
+    if todo:
+        first = {k: i for i, k in reversed(list(enumerate(keys)))}
+        embs = model.encode([texts[first[k]] for k in todo], normalize_embeddings=True, show_progress_bar=False,
+                            batch_size=batch_size)
+        cache.put_many(model_name, todo, embs)
+        found.update(zip(todo, np.asarray(embs, dtype=np.float32)))
+    return np.stack([np.asarray(found[k], dtype=np.float32) for k in keys]) if keys else np.zeros((0, 0), np.float32)
+
+def parse_annot_lines(lines: str) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for raw in (lines or "").splitlines():
+        raw = raw.strip()
+        if not raw or raw.startswith("#"):
+            continue
+        if "=" in raw:
+            k, v = raw.split("=", 1)
+            out[k.strip()] = v.strip()
+    return out
+
+def write_collection_manifest(db_dir: str, collection_name: str, data: Dict) -> str:
+    return write_manifest(db_dir, collection_name, data)
+
+
+# ---------------- Parse stage (runs in worker processes) ----------------
+
+def parse_file(path: str, old: Dict[str, Any] | None, full: bool, chunk_size: int, overlap: float,
+               base_meta: Dict[str, Any], chunker: str = "sentence", model_name: str = "",
+               fingerprint: bool = False) -> Dict[str, Any]:
+    """
+    Decide whether one file needs embedding and, if so, chunk it.
+    Returns {"path", "status": "skipped"|"touched"|"added"|"changed", "record", "chunks", "stale", "fps", "sec"};
+    fps holds one (simhash, word count) per chunk when fingerprint=True.
+    """
+    t0 = time.perf_counter()
+    p = Path(path)
+    st = p.stat()
+    out: Dict[str, Any] = {"path": path, "chunks": [], "stale": [], "fps": [], "record": None}
+    if old and not full and old["mtime"] == st.st_mtime and old["size"] == st.st_size:
+        out.update(status="skipped", sec=time.perf_counter() - t0)
+        return out
+    digest = file_sha256(path)
+    if old and not full and old["sha256"] == digest:
+        out.update(status="touched", record={"path": path, "mtime": st.st_mtime, "size": st.st_size},
+                   sec=time.perf_counter() - t0)
+        return out
+
+    fm, body = read_markdown_with_frontmatter(p)
+    title = str(fm.get("title") or p.stem)
+    canonical_url = str(fm.get("url") or "")
+    tags = ensure_semicolon_list(fm.get("tags"))
+    doc_id = stable_doc_id(canonical_url, p)
+
+    chunks = chunk_body(body, chunker, chunk_size, overlap, model_name)
+    chunk_ids = [f"{doc_id}#c{i:05d}" for i in range(len(chunks))]
+    for i, (chunk_id, (ch, heading_path)) in enumerate(zip(chunk_ids, chunks)):
+        meta = {
+            "title": title,
+            "canonical_url": canonical_url,
+            "tags": tags,
+            "source_path": str(p),
+            "doc_id": doc_id,
+            "chunk_index": i,
+        }
+        if chunker == "markdown":
+            meta["heading_path"] = heading_path
+        meta.update(base_meta)
+        out["chunks"].append((chunk_id, ch, meta))
+        if fingerprint:
+            out["fps"].append(simhash(ch))
+
+    if old:
+        out["stale"] = sorted(set(old["chunk_ids"]) - set(chunk_ids))
+    out.update(
+        status="changed" if old else "added",
+        record={"path": path, "sha256": digest, "mtime": st.st_mtime, "size": st.st_size, "chunk_ids": chunk_ids},
+        sec=time.perf_counter() - t0,
+    )
+    return out
+
+
+class _InlineExecutor:
+    """Executor stand-in that runs tasks in the caller (workers=0: no process pool)."""
+
+    def submit(self, fn, *args) -> Future:
+        f: Future = Future()
+        try:
+            f.set_result(fn(*args))
+        except BaseException as e:
+            f.set_exception(e)
+        return f
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        pass
+
+
+# ---------------- Embed / write stages ----------------
+
+class BatchSizer:
+    """
+    Hill-climbing batch size for the embedder: double while per-chunk encode time
+    keeps improving, back off when it gets worse; always within [lo, hi].
+    """
+
+    def __init__(self, start: int, lo: int = 8, hi: int = 512):
+        self.lo, self.hi = lo, max(lo, hi)
+        self.size = min(max(start, lo), self.hi)
+        self._best = float("inf")
+
+    def update(self, n: int, sec: float) -> int:
+        if n < self.size:  # partial batch (queue ran dry): says nothing about the model
+            return self.size
+        per = sec / max(1, n)
+        if per < self._best * 0.95:
+            self._best = per
+            self.size = min(self.hi, self.size * 2)
+        elif per > self._best * 1.25:
+            self.size = max(self.lo, self.size // 2)
+        return self.size
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0     # seconds spent doing the stage's work
+        self.blocked = 0.0  # seconds spent waiting on a full downstream queue
+
+    def as_dict(self, wall: float) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "busy_sec": round(self.busy, 3),
+            "blocked_sec": round(self.blocked, 3),
+            "per_sec": round(self.items / self.busy, 1) if self.busy > 0 else 0.0,
+            "utilization": round(self.busy / wall, 3) if wall > 0 else 0.0,
+        }
+
+
+_DONE = object()
+
+
+def _put(q: "queue.Queue", item: Any, stats: StageStats, failed: threading.Event) -> None:
+    """Blocking put that gives up if another stage failed (so nothing deadlocks)."""
+    t0 = time.perf_counter()
+    while not failed.is_set():
+        try:
+            q.put(item, timeout=0.2)
+            break
+        except queue.Full:
+            continue
+    stats.blocked += time.perf_counter() - t0
+
+
+def _put_done(q: "queue.Queue", consumer: threading.Thread) -> None:
+    """Send the end marker unless the consumer has already exited."""
+    while consumer.is_alive():
+        try:
+            q.put(_DONE, timeout=0.2)
+            return
+        except queue.Full:
+            continue
+
+
+def staged_ingest(
+    md_files: List[str],
+    coll,
+    findex: FileIndex,
+    model,
+    model_name: str,
+    chunk_size: int,
+    overlap: float,
+    base_meta: Dict[str, Any],
+    known: Dict[str, Dict[str, Any]] | None = None,
+    full: bool = False,
+    batch: int = 64,
+    max_batch: int = 512,
+    workers: int | None = None,
+    queue_chunks: int = 4096,
+    progress_every: int = 20,
+    run_id: str = "",
+    chunker: str = "sentence",
+    embed_cache=None,
+    dedup: str = "off",
+    dedup_distance: int = 6,
+    dedup_min_words: int = 8,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Run parse -> embed -> write over md_files and yield progress events:
+      {"event": "progress", "files_done", "files_total", "chunks_written", "batch_size"}
+      {"event": "done", "counts": {added, changed, removed, skipped}, "chunks": n, "stages": {...}, "wall_sec"}
+    File records are committed by the writer only after all of the file's chunks are upserted,
+    tagged with run_id; on a full re-embed, files already committed under run_id are skipped
+    (that is how an interrupted run resumes). Files in `known` but not in md_files are deleted at the end.
+    dedup="drop"|"link": chunks of >= dedup_min_words words within dedup_distance SimHash bits of an
+    already indexed chunk are not written ("drop") or written with meta dup_of=<surviving id> ("link").
+    When a surviving chunk goes away (its file changed or was removed), the files holding duplicates
+    of it are re-ingested after md_files so they get a new survivor (counts["orphans"]).
+    """
+    known = known or {}
+    workers = max(0, (os.cpu_count() or 2) - 1) if workers is None else workers
+    chunk_q: "queue.Queue" = queue.Queue(maxsize=max(1, queue_chunks))
+    write_q: "queue.Queue" = queue.Queue(maxsize=4)
+    failed = threading.Event()
+    errors: List[BaseException] = []
+    parse_st, embed_st, write_st = StageStats("parse"), StageStats("embed"), StageStats("write")
+    sizer = BatchSizer(batch, lo=min(8, batch), hi=max_batch)
+    written = [0]
+
+    def embed_stage():
+        try:
+            done = False
+            while not done:
+                ids, docs, metas, files = [], [], [], []
+                item = chunk_q.get()
+                while True:
+                    if item is _DONE:
+                        done = True
+                        break
+                    if item[0] == "chunk":
+                        ids.append(item[1]); docs.append(item[2]); metas.append(item[3])
+                    else:
+                        files.append(item[1])
+                    if len(ids) >= sizer.size:
+                        break
+                    try:  # take whatever is queued; don't idle waiting for a full batch
+                        item = chunk_q.get(timeout=0.05)
+                    except queue.Empty:
+                        break
+                embs = None
+                if ids:
+                    t0 = time.perf_counter()
+                    misses = embed_cache.misses if embed_cache is not None else 0
+                    embs = embed_passages(model, docs, model_name, batch_size=len(docs), cache=embed_cache)
+                    dt = time.perf_counter() - t0
+                    embed_st.busy += dt
+                    embed_st.items += len(ids)
+                    # only model work says anything about the batch size (cache hits are nearly free)
+                    sizer.update(embed_cache.misses - misses if embed_cache is not None else len(ids), dt)
+                if ids or files:
+                    _put(write_q, (ids, docs, metas, embs, files), embed_st, failed)
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+        finally:
+            _put_done(write_q, writer)
+
+    def write_stage():
+        while True:
+            item = write_q.get()
+            if item is _DONE:
+                break
+            if failed.is_set():
+                continue  # keep draining so the embedder can finish
+            try:
+                ids, docs, metas, embs, files = item
+                t0 = time.perf_counter()
+                if ids:
+                    coll.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=embs)
+                stale = [cid for f in files for cid in f["stale"]]
+                if stale:
+                    coll.delete(ids=stale)
+                if files:
+                    findex.remove_fingerprints([cid for f in files for cid in f["old_ids"]])
+                    findex.put_fingerprints([row for f in files for row in f["fps"]])
+                    findex.put_many([f["record"] for f in files])
+                write_st.busy += time.perf_counter() - t0
+                write_st.items += len(ids)
+                written[0] += len(ids)
+            except BaseException as e:
+                errors.append(e)
+                failed.set()
+
+    counts = {"added": 0, "changed": 0, "removed": 0, "skipped": 0, "duplicates": 0, "orphans": 0}
+    seen = {str(Path(p)) for p in md_files}
+    removed = [k for k in known if k not in seen]
+    near: SimHashIndex | None = None  # surviving chunks' fingerprints, when dedup is on
+    fps: Dict[str, Tuple[int, str]] = {}  # chunk id -> (signed fp, dup_of) as the run leaves it
+    owner: Dict[str, str] = {}  # chunk id -> file path, for the fingerprinted chunks
+    gone: set = set()  # survivors whose chunk changed or went away this run
+    redone: set = set()  # files re-chunked this run
+    if dedup != "off":
+        near = SimHashIndex(dedup_distance)
+        fps = findex.fingerprints()
+        owner = {cid: k for k, r in known.items() for cid in r["chunk_ids"] if cid in fps}
+        for cid in (cid for k in removed for cid in known[k]["chunk_ids"]):
+            fp_row = fps.pop(cid, None)
+            if fp_row is not None and not fp_row[1]:
+                gone.add(cid)
+        # a full re-embed only trusts chunks already written by this (resumed) run
+        trusted = None
+        if full:
+            trusted = {c for r in known.values() if run_id and r.get("run_id") == run_id for c in r["chunk_ids"]}
+        for cid, (fp, dup_of) in fps.items():
+            if not dup_of and (trusted is None or cid in trusted):
+                near.add(cid, to_unsigned(fp))
+
+    def orphaned() -> List[str]:
+        """Files (not already re-chunked) with duplicates of a survivor in `gone`."""
+        deps = sorted({owner[cid] for cid, (_, dup_of) in fps.items() if dup_of in gone} - redone)
+        gone.clear()
+        return deps
+    embedder = threading.Thread(target=embed_stage, name="ingest-embed", daemon=True)
+    writer = threading.Thread(target=write_stage, name="ingest-write", daemon=True)
+    for t in (embedder, writer):
+        t.start()
+
+    t_start = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else _InlineExecutor()
+    window = max(2, 2 * max(1, workers))  # parse results in flight (backpressure on the pool)
+    inflight: "deque[Future]" = deque()
+    todo = deque((p, False) for p in md_files)  # (path, force re-chunk)
+    total = len(md_files)
+    done_files = 0
+    try:
+        while True:
+            while todo and len(inflight) < window and not failed.is_set():
+                path, force = todo.popleft()
+                key = str(Path(path))
+                old = known.get(key)
+                redo = force or (full and not (run_id and old and old.get("run_id") == run_id))
+                inflight.append(pool.submit(parse_file, key, old, redo, chunk_size, overlap, base_meta,
+                                            chunker, model_name, near is not None))
+            if not inflight and gone and not failed.is_set():
+                # every file is parsed: now re-chunk the ones whose duplicates lost their survivor
+                deps = orphaned()
+                todo.extend((p, True) for p in deps)
+                total += len(deps)
+                counts["orphans"] += len(deps)
+                continue
+            if not inflight or failed.is_set():
+                break
+            res = inflight.popleft().result()  # in submission order: deterministic chunk order
+            parse_st.items += 1
+            parse_st.busy += res["sec"]
+            done_files += 1
+            status = res["status"]
+            if status in ("skipped", "touched"):
+                counts["skipped"] += 1
+                if status == "touched":
+                    r = res["record"]
+                    findex.touch(r["path"], r["mtime"], r["size"])
+            else:
+                counts[status] += 1
+                old_ids = (known.get(res["path"]) or {}).get("chunk_ids", [])
+                fp_rows: List[Tuple[str, int, str]] = []
+                if near is not None:
+                    for cid in old_ids:  # the file's previous chunks must not match its new ones
+                        near.remove(cid)
+                for i, (cid, text, meta) in enumerate(res["chunks"]):
+                    if near is not None and res["fps"][i][1] >= dedup_min_words:
+                        fp = res["fps"][i][0]
+                        match = near.find(fp)
+                        fp_rows.append((cid, to_signed(fp), match or ""))
+                        if match:
+                            counts["duplicates"] += 1
+                            if dedup == "drop":
+                                continue
+                            meta = dict(meta, dup_of=match)
+                        else:
+                            near.add(cid, fp)
+                    _put(chunk_q, ("chunk", cid, text, meta), parse_st, failed)
+                if near is not None:
+                    redone.add(res["path"])
+                    new_rows = {cid: (fp, dup_of) for cid, fp, dup_of in fp_rows}
+                    for cid in old_ids:
+                        fp_row = fps.pop(cid, None)
+                        owner.pop(cid, None)
+                        if fp_row is not None and not fp_row[1] and new_rows.get(cid) != (fp_row[0], ""):
+                            gone.add(cid)
+                    fps.update(new_rows)
+                    owner.update((cid, res["path"]) for cid in new_rows)
+                _put(chunk_q, ("file", {"record": dict(res["record"], run_id=run_id), "stale": res["stale"],
+                                        "old_ids": old_ids, "fps": fp_rows}), parse_st, failed)
+            if done_files % progress_every == 0 or done_files == total:
+                yield {"event": "progress", "files_done": done_files, "files_total": total,
+                       "chunks_written": written[0], "batch_size": sizer.size}
+    finally:
+        for f in inflight:
+            f.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
+        _put_done(chunk_q, embedder)
+        for t in (embedder, writer):
+            t.join()
+    if errors:
+        raise errors[0]
+
+    for k in removed:
+        if known[k]["chunk_ids"]:
+            coll.delete(ids=known[k]["chunk_ids"])
+    findex.remove_many(removed)
+    findex.remove_fingerprints([cid for k in removed for cid in known[k]["chunk_ids"]])
+    counts["removed"] = len(removed)
+
+    wall = time.perf_counter() - t_start
+    yield {
+        "event": "done",
+        "counts": counts,
+        "chunks": written[0],
+        "wall_sec": round(wall, 3),
+        "stages": {s.name: s.as_dict(wall) for s in (parse_st, embed_st, write_st)},
+        "final_batch_size": sizer.size,
+        "embed_cache": embed_cache.stats() if embed_cache is not None else None,
+    }
+
+
+# ---------------- Whole run: collection, checkpoint, manifest, exports ----------------
+
+def ingest_collection(
+    md_dir: str,
+    db_dir: str,
+    base: str,
+    profile: str,
+    model_name: str,
+    chunk_size: int,
+    overlap: float,
+    batch: int = 64,
+    run_label: str = "",
+    annotations: Dict[str, str] | None = None,
+    incremental: bool = True,
+    resume: bool = True,
+    workers: int | None = RAG_INGEST_WORKERS,
+    chunker: str = "sentence",
+    dedup: str = RAG_DEDUP,
+    dedup_distance: int = RAG_DEDUP_DISTANCE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Embed every .md file under md_dir into <base>_<profile> and yield events:
+      {"event": "log", "message"}
+      {"event": "start", "collection", "files_total", "run_id", "resumed"}
+      {"event": "progress", "files_done", "files_total", "chunks_written", "batch_size", "count"}
+      {"event": "error", "message"}   (run not started; nothing else follows)
+      {"event": "done", "collection", "manifest_path", "count", "counts", "chunks", "stages", "wall_sec", "run_id"}
+    Completed files are checkpointed in the collection's FileIndex as they are written. A run that
+    stops early (crash, Ctrl-C) stays "running" there and the next call with the same
+    model/chunking/mode picks up after the last committed file; resume=False starts over.
+    chunker="markdown" sizes chunk_size in embedder tokens (see md_chunks) and records heading_path.
+    dedup="drop"|"link" collapses near-duplicate chunks (see dedup.py and staged_ingest).
+    """
+    import chromadb
+
+    if chunker not in CHUNKERS:
+        yield {"event": "error", "message": f"Unknown chunker {chunker!r} (expected one of {', '.join(CHUNKERS)})"}
+        return
+    if dedup not in DEDUP_MODES:
+        yield {"event": "error", "message": f"Unknown dedup mode {dedup!r} (expected one of {', '.join(DEDUP_MODES)})"}
+        return
+
+    def log(msg: str) -> Dict[str, Any]:
+        return {"event": "log", "message": msg}
+
+    if not os.path.isdir(md_dir):
+        yield {"event": "error", "message": f"Markdown folder not found: {md_dir}"}
+        return
+    os.makedirs(db_dir, exist_ok=True)
+    md_files = sorted(glob.glob(os.path.join(md_dir, "**", "*.md"), recursive=True))
+    if not md_files:
+        yield {"event": "error", "message": f"No .md files found in {md_dir}"}
+        return
+
+    collection_name = f"{base}_{profile}"
+    client = chromadb.PersistentClient(path=db_dir)
+    try:
+        coll = client.create_collection(collection_name, metadata={"profile": profile})
+    except Exception:
+        coll = client.get_collection(collection_name)
+
+    yield log(f"🔧 Loading embedder: {model_name}")
+    model = build_embedder(model_name)
+    annotations = dict(annotations or {})
+
+    # Incremental state: per-file sha256/mtime/size + chunk ids, and the parameters they were embedded with
+    findex = FileIndex(file_index_path(db_dir, collection_name))
+    ecache = None
+    if RAG_EMBED_CACHE:
+        from .embed_cache import EmbeddingCache, embed_cache_path
+        ecache = EmbeddingCache(RAG_EMBED_CACHE_PATH or embed_cache_path(db_dir))
+    try:
+        params = {"model_name": model_name, "chunk_size": int(chunk_size), "overlap": float(overlap)}
+        if chunker != "sentence":  # sentence-chunked indexes keep their params (no spurious re-embed)
+            params["chunker"] = chunker
+        if dedup != "off":
+            params["dedup"] = [dedup, int(dedup_distance)]
+        known = findex.all()
+        full = not incremental or (bool(known) and findex.params() != params)
+        run_id, resumed = findex.begin_run(params, full, resume=resume)
+        if resumed:
+            done_before = sum(1 for r in known.values() if r.get("run_id") == run_id)
+            yield log(f"⏯️ Resuming run {run_id} ({done_before} files already committed).")
+        elif known and full:
+            yield log("♻️ Re-embedding every file (incremental off or model/chunking changed).")
+        base_meta = {
+            "profile": profile,
+            "model_name": model_name,
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "run_label": run_label,
+            "chunker": chunker,
+        }
+        base_meta.update(annotations)
+        if chunker == "markdown":
+            yield log(f"✂️ Markdown chunker: up to {markdown_token_budget(chunk_size, model_name)} tokens per chunk.")
+
+        yield {"event": "start", "collection": collection_name, "files_total": len(md_files),
+               "run_id": run_id, "resumed": resumed}
+        yield log(f"📁 Files to process: {len(md_files)}")
+
+        summary: Dict[str, Any] = {}
+        for ev in staged_ingest(md_files, coll, findex, model, model_name, int(chunk_size), float(overlap), base_meta,
+                                known=known, full=full, batch=int(batch), workers=workers, run_id=run_id,
+                                chunker=chunker, embed_cache=ecache, dedup=dedup, dedup_distance=int(dedup_distance)):
+            if ev["event"] == "progress":
+                yield dict(ev, count=coll.count())
+            else:
+                summary = ev
+        findex.set_params(params)
+        findex.finish_run(summary["counts"])
+        dup_summary = findex.duplicate_summary() if dedup != "off" else None
+    finally:
+        findex.close()
+        if ecache is not None:
+            ecache.close()
+
+    counts = summary["counts"]
+    yield log("🧾 added {added}, changed {changed}, removed {removed}, skipped {skipped} (chunks embedded: {n})".format(
+        n=summary["chunks"], **counts))
+    yield log("⏱️ " + ", ".join(f"{name} {st['items']} @ {st['per_sec']}/s (busy {st['utilization']:.0%})"
+                               for name, st in summary["stages"].items()) + f"; wall {summary['wall_sec']:.1f}s")
+    if summary.get("embed_cache"):
+        ec = summary["embed_cache"]
+        yield log(f"🗃️ Embedding cache: {ec['hits']} hits / {ec['misses']} misses ({ec['hit_rate']:.0%})")
+    if dup_summary is not None:
+        yield log(f"🧹 Near-duplicates ({dedup}, <= {dedup_distance} bits): {counts['duplicates']} this run, "
+                  f"{dup_summary['duplicates']} in collection onto {dup_summary['survivors_with_duplicates']} chunks")
+        if counts["orphans"]:
+            yield log(f"🧹 Re-ingested {counts['orphans']} files whose duplicates lost their surviving chunk")
+
+    count = coll.count()
+    mpath = write_collection_manifest(db_dir, collection_name, {
+        "collection": collection_name,
+        "base": base,
+        "profile": profile,
+        "model_name": model_name,
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "chunker": chunker,
+        "run_label": run_label,
+        "dedup": dict(dup_summary, mode=dedup, max_distance=int(dedup_distance)) if dup_summary is not None else None,
+        "annotations": annotations,
+        "db_dir": db_dir,
+        "md_dir": md_dir,
+        "host": socket.gethostname(),
+        "updated_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "count": count,
+        "last_run": dict(counts, stages=summary["stages"], wall_sec=summary["wall_sec"], run_id=run_id, resumed=resumed,
+                         embed_cache=summary.get("embed_cache")),
+    })
+
+    # Memory-mapped export for retrieval (shared across processes); the Chroma collection stays authoritative
+    if RAG_MMAP:
+        try:
+            from .ann_index import build_for_collection, should_build
+            from .mmap_store import export_collection
+            exp = export_collection(db_dir, collection_name, dtype=RAG_MMAP_DTYPE)
+            yield log(f"🗺️ mmap export: {exp['count']} x {exp['dim']} {exp['dtype']}")
+            if RAG_QUANT == "int8":
+                from .quant import quantize_collection
+                qi = quantize_collection(db_dir, collection_name)
+                yield log(f"🗜️ int8 vectors: {qi['memory']['int8_bytes'] / 1e6:.1f} MB "
+                          f"({qi['memory']['savings_vs_float32']:.0%} smaller than float32); "
+                          f"recall delta @{qi['report']['k']} with {qi['rescore']}x rescoring: {qi['recall_delta']:+.4f}")
+            kind = should_build(exp["count"])
+            if kind:
+                ann = build_for_collection(db_dir, collection_name, kind=kind)
+                yield log(f"🧭 ANN {ann['kind']} {ann['params']} built in {ann['build_sec']}s; search {ann['search']}")
+        except Exception as e:
+            yield log(f"⚠️ mmap export/quantization/ANN build failed ({e}); retrieval will read Chroma directly.")
+
+    yield {"event": "done", "collection": collection_name, "manifest_path": mpath, "count": count, "counts": counts,
+           "chunks": summary["chunks"], "stages": summary["stages"], "wall_sec": summary["wall_sec"], "run_id": run_id,
+           "embed_cache": summary.get("embed_cache")}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Embed a Markdown folder into a Chroma collection (resumable).")
+    ap.add_argument("--md-dir", default=RAG_MD_DIR)
+    ap.add_argument("--db-dir", default=RAG_DB_DIR)
+    ap.add_argument("--base", default=RAG_BASE)
+    ap.add_argument("--profile", required=True, help="Collection suffix, e.g. bge_s650_o15")
+    ap.add_argument("--model", default="BAAI/bge-base-en-v1.5")
+    ap.add_argument("--chunk-size", type=int, default=650, help="Chars (sentence chunker) or tokens (markdown)")
+    ap.add_argument("--chunker", choices=CHUNKERS, default="sentence")
+    ap.add_argument("--dedup", choices=DEDUP_MODES, default=RAG_DEDUP, help="Near-duplicate chunks: keep, drop or link")
+    ap.add_argument("--dedup-distance", type=int, default=RAG_DEDUP_DISTANCE, help="Max SimHash bit distance")
+    ap.add_argument("--overlap", type=float, default=0.15)
+    ap.add_argument("--batch", type=int, default=64)
+    ap.add_argument("--run-label", default="")
+    ap.add_argument("--annotate", action="append", default=[], metavar="KEY=VALUE")
+    ap.add_argument("--full", action="store_true", help="Re-embed every file (default: incremental)")
+    ap.add_argument("--no-resume", action="store_true", help="Ignore an interrupted run and start a new one")
+    ap.add_argument("--workers", type=int, default=RAG_INGEST_WORKERS, help="Parse processes (0 = in-process)")
+    ap.add_argument("--json", action="store_true", help="Print events as JSON lines instead of log text")
+    args = ap.parse_args()
+
+    events = ingest_collection(
+        args.md_dir, args.db_dir, args.base, args.profile, args.model, args.chunk_size, args.overlap,
+        batch=args.batch, run_label=args.run_label, annotations=parse_annot_lines("\n".join(args.annotate)),
+        incremental=not args.full, resume=not args.no_resume, workers=args.workers, chunker=args.chunker,
+        dedup=args.dedup, dedup_distance=args.dedup_distance,
+    )
+    try:
+        for ev in events:
+            if args.json:
+                print(json.dumps(ev, ensure_ascii=False), flush=True)
+            elif ev["event"] == "log":
+                print(ev["message"], flush=True)
+            elif ev["event"] == "progress":
+                print(f"[ingest] {ev['files_done']}/{ev['files_total']} files, {ev['chunks_written']} chunks written",
+                      flush=True)
+            elif ev["event"] == "error":
+                print(f"[ingest] error: {ev['message']}", file=sys.stderr)
+            elif ev["event"] == "done":
+                print(f"[ingest] {ev['collection']}: {ev['count']} items; manifest {ev['manifest_path']}")
+            if ev["event"] == "error":
+                sys.exit(1)
+    except KeyboardInterrupt:
+        print("[ingest] interrupted; re-run the same command to resume.", file=sys.stderr)
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
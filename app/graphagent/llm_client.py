@@ -1,38 +1,529 @@
 from __future__ import annotations
-from openai import OpenAI
-from .config import API_BASE, API_KEY, MODEL, TEMPERATURE, MAX_TOKENS
 
-_client = OpenAI(base_url=API_BASE, api_key=API_KEY)
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Coroutine, Dict, Iterator, List, Tuple, TypeVar
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from .config import (
+    API_BASE, API_KEY, MODEL, TEMPERATURE, MAX_TOKENS,
+    LLM_MAX_CONCURRENCY, LLM_TIMEOUT, LLM_ENDPOINT_MODE, LLM_MODE_CACHE, LLM_RETRIES,
+    LLM_CACHE, LLM_CACHE_PATH, LLM_CACHE_MEMORY, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES,
+)
+from .llm_cache import ResponseCache, cache_key
+from .tracing import span
+
+T = TypeVar("T")
 
 SYSTEM_PROMPT = (
     "You are GraphAgent, a principled planner-executor. "
     "Prefer structured, concise outputs; use provided tools when asked."
 )
 
-def call_llm(prompt: str, temperature: float | None = None, system: str | None = SYSTEM_PROMPT) -> str:
+
+# --- endpoint mode cache ---
+# (API_BASE, MODEL) -> {"mode": "chat"|"completions", "probe_ms": float, "source": str}
+_modes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_modes_lock = threading.Lock()
+
+
+def _mode_key(base_url: str, model: str) -> str:
+    return f"{base_url}|{model}"
+
+
+def _read_mode_file() -> Dict[str, Any]:
+    if not LLM_MODE_CACHE or not os.path.isfile(LLM_MODE_CACHE):
+        return {}
+    try:
+        with open(LLM_MODE_CACHE, "r", encoding="utf-8") as f:
+            return json.load(f) or {}
+    except Exception:
+        return {}
+
+
+def _cached_mode(base_url: str, model: str) -> Dict[str, Any] | None:
+    with _modes_lock:
+        info = _modes.get((base_url, model))
+        if info is None:
+            disk = _read_mode_file().get(_mode_key(base_url, model))
+            if disk and disk.get("mode") in ("chat", "completions"):
+                info = _modes[(base_url, model)] = dict(disk, source="disk")
+        return info
+
+
+def _store_mode(base_url: str, model: str, info: Dict[str, Any], persist: bool = True) -> None:
+    with _modes_lock:
+        _modes[(base_url, model)] = info
+        if not (persist and LLM_MODE_CACHE):
+            return
+        data = _read_mode_file()
+        data[_mode_key(base_url, model)] = {"mode": info["mode"], "probe_ms": info.get("probe_ms")}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(LLM_MODE_CACHE)), exist_ok=True)
+            with open(LLM_MODE_CACHE, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+        except OSError:
+            pass  # the in-process cache still applies
+
+
+def endpoint_info(base_url: str = API_BASE, model: str = MODEL) -> Dict[str, Any] | None:
+    """Chosen endpoint mode and probe latency for base_url/model, or None if not probed yet."""
+    info = _cached_mode(base_url, model)
+    return dict(info, base_url=base_url, model=model) if info else None
+
+
+def _note_usage(meta: Dict[str, Any] | None, resp: Any) -> None:
+    usage = getattr(resp, "usage", None)
+    if meta is None or usage is None:
+        return
+    meta["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+    meta["completion_tokens"] = getattr(usage, "completion_tokens", None)
+
+
+def _chat_unsupported(exc: openai.APIStatusError) -> bool:
+    """The server has no chat route for this model: 404/405, or a 400 that names the chat route."""
+    if exc.status_code in (404, 405):
+        return True
+    return exc.status_code == 400 and "chat" in str(exc).lower()
+
+
+def _is_transient(exc: BaseException) -> bool:
     """
-    Calls a local OpenAI-compatible /v1/chat/completions.
-    Falls back to /v1/completions if chat isn't supported.
+    Connection failures, 429 and 5xx are worth retrying; other errors are not.
+    A read timeout means the server is busy generating: re-sending the request
+    would only add load, so only timeouts while connecting are retried.
     """
-    temp = TEMPERATURE if temperature is None else temperature
-    try:
-        resp = _client.chat.completions.create(
-            model=MODEL,
+    if isinstance(exc, openai.APITimeoutError):
+        return isinstance(exc.__cause__, httpx.ConnectTimeout)
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+# --- response cache ---
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache | None:
+    """Process-wide response cache, or None when LOCAL_LLM_CACHE is off."""
+    global _cache
+    if not LLM_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                path=LLM_CACHE_PATH,
+                max_memory=LLM_CACHE_MEMORY,
+                ttl_sec=LLM_CACHE_TTL,
+                max_entries=LLM_CACHE_MAX_ENTRIES,
+            )
+    return _cache
+
+
+def cache_stats() -> Dict[str, Any] | None:
+    """Hit/miss counters of the response cache (None when disabled)."""
+    cache = get_cache()
+    return cache.stats() if cache else None
+
+
+# --- async session ---
+class LLMSession:
+    """
+    One pooled HTTP connection set to an OpenAI-compatible server, with a cap on
+    the number of requests in flight. Bound to the event loop it is first used on.
+
+        async with LLMSession(max_concurrency=8) as s:
+            answers = await s.map(["q1", "q2", "q3"])
+    """
+
+    def __init__(
+        self,
+        base_url: str = API_BASE,
+        api_key: str = API_KEY,
+        model: str = MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT,
+    ):
+        self.base_url = base_url
+        self.model = model
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+            timeout=timeout,
+        )
+        # Retries are handled by _with_retries so that only transient errors are retried
+        self._client = AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=self._http, max_retries=0)
+        self._mode_lock = asyncio.Lock()
+
+    async def _chat(self, prompt: str, temp: float, system: str | None, max_tokens: int = MAX_TOKENS,
+                    meta: Dict[str, Any] | None = None) -> str:
+        resp = await self._client.chat.completions.create(
+            model=self.model,
             temperature=temp,
-            max_tokens=MAX_TOKENS,
+            max_tokens=max_tokens,
             messages=(
                 ([{"role": "system", "content": system}] if system else [])
                 + [{"role": "user", "content": prompt}]
             ),
         )
+        _note_usage(meta, resp)
         return (resp.choices[0].message.content or "").strip()
-    except Exception:
-        # Some local servers only implement /v1/completions
-        resp = _client.completions.create(
-            model=MODEL,
+
+    async def _completion(self, prompt: str, temp: float, system: str | None, max_tokens: int = MAX_TOKENS,
+                          meta: Dict[str, Any] | None = None) -> str:
+        resp = await self._client.completions.create(
+            model=self.model,
             temperature=temp,
-            max_tokens=MAX_TOKENS,
+            max_tokens=max_tokens,
             prompt=(f"[SYSTEM]\n{system}\n\n[USER]\n{prompt}" if system else prompt),
         )
+        _note_usage(meta, resp)
         return (resp.choices[0].text or "").strip()
 
+    async def _with_retries(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(LLM_RETRIES + 1):
+            try:
+                return await make_call()
+            except Exception as e:
+                if attempt >= LLM_RETRIES or not _is_transient(e):
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        raise AssertionError("unreachable")
+
+    async def detect_mode(self) -> str:
+        """
+        'chat' or 'completions' for this base_url/model. Probed once (a 1-token chat
+        request) and cached for the process lifetime, and on disk if LLM_MODE_CACHE is set.
+        Only a missing chat route (see _chat_unsupported) falls back to completions, and
+        only once a completions probe succeeds; any other error (bad key, transient
+        failure) is raised and nothing is cached.
+        """
+        info = _cached_mode(self.base_url, self.model)
+        if info:
+            return info["mode"]
+        async with self._mode_lock:
+            info = _cached_mode(self.base_url, self.model)
+            if info:
+                return info["mode"]
+            if LLM_ENDPOINT_MODE in ("chat", "completions"):
+                info = {"mode": LLM_ENDPOINT_MODE, "probe_ms": 0.0, "source": "config"}
+            else:
+                t0 = time.perf_counter()
+                try:
+                    await self._with_retries(lambda: self._chat("ping", 0.0, None, max_tokens=1))
+                    mode = "chat"
+                except openai.APIStatusError as e:
+                    if not _chat_unsupported(e):
+                        raise
+                    # Some local servers only implement /v1/completions
+                    await self._with_retries(lambda: self._completion("ping", 0.0, None, max_tokens=1))
+                    mode = "completions"
+                info = {"mode": mode, "probe_ms": round((time.perf_counter() - t0) * 1000, 1), "source": "probe"}
+            _store_mode(self.base_url, self.model, info, persist=info["source"] == "probe")
+            return info["mode"]
+
+    async def complete(
+        self,
+        prompt: str,
+        temperature: float | None = None,
+        system: str | None = SYSTEM_PROMPT,
+        max_tokens: int | None = None,
+        cache: bool = False,
+        meta: Dict[str, Any] | None = None,
+    ) -> str:
+        """
+        Calls /v1/chat/completions or /v1/completions, whichever detect_mode() picked.
+        Waits for a free slot when max_concurrency requests are already in flight.
+        cache=True serves/stores the response in the response cache (if enabled);
+        only use it for deterministic, template-driven calls.
+        meta (optional dict) is filled with mode, cache hit and token usage.
+        """
+        if meta is None:
+            meta = {}
+        temp = TEMPERATURE if temperature is None else temperature
+        mtok = MAX_TOKENS if max_tokens is None else max_tokens
+        store = get_cache() if cache else None
+        key = ""
+        if store is not None:
+            key = cache_key(self.model, system, prompt, temp, mtok)
+            hit = store.get(key)
+            meta["cached"] = hit is not None
+            if hit is not None:
+                return hit
+
+        mode = await self.detect_mode()
+        meta["mode"] = mode
+        async with self._sem:
+            text = None
+            if mode == "chat":
+                try:
+                    text = await self._with_retries(lambda: self._chat(prompt, temp, system, mtok, meta))
+                except openai.APIStatusError as e:
+                    if e.status_code not in (404, 405):
+                        raise
+            if text is None:
+                text = await self._with_retries(lambda: self._completion(prompt, temp, system, mtok, meta))
+                if mode == "chat":
+                    # Chat route disappeared (server/model swapped) and completions answered: remember it
+                    _store_mode(self.base_url, self.model, {"mode": "completions", "probe_ms": 0.0, "source": "fallback"})
+                    meta["mode"] = "completions"
+
+        if store is not None and text:
+            store.put(key, text)
+        return text
+
+    async def stream(
+        self,
+        prompt: str,
+        temperature: float | None = None,
+        system: str | None = SYSTEM_PROMPT,
+        max_tokens: int | None = None,
+        meta: Dict[str, Any] | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Like complete(), but yields text deltas as the server produces them (stream=True).
+        Holds one concurrency slot until the stream is exhausted or closed. Never cached.
+        meta (optional dict) gets the mode and, on chat, the token usage the server reports
+        in its final chunk (stream_options.include_usage). A 404/405 from the chat route
+        falls back to completions as in complete().
+        """
+        if meta is None:
+            meta = {}
+        temp = TEMPERATURE if temperature is None else temperature
+        mtok = MAX_TOKENS if max_tokens is None else max_tokens
+        mode = await self.detect_mode()
+        meta["mode"] = mode
+        async with self._sem:
+            resp = None
+            if mode == "chat":
+                try:
+                    resp = await self._with_retries(lambda: self._client.chat.completions.create(
+                        model=self.model,
+                        temperature=temp,
+                        max_tokens=mtok,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        messages=(
+                            ([{"role": "system", "content": system}] if system else [])
+                            + [{"role": "user", "content": prompt}]
+                        ),
+                    ))
+                except openai.APIStatusError as e:
+                    if e.status_code not in (404, 405):
+                        raise
+            if resp is not None:
+                async for chunk in resp:
+                    _note_usage(meta, chunk)
+                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                return
+            # stream_options is chat-only: many completions servers reject it
+            resp = await self._with_retries(lambda: self._client.completions.create(
+                model=self.model,
+                temperature=temp,
+                max_tokens=mtok,
+                stream=True,
+                prompt=(f"[SYSTEM]\n{system}\n\n[USER]\n{prompt}" if system else prompt),
+            ))
+            if mode == "chat":
+                # same fallback as complete(): chat route gone, completions answered
+                _store_mode(self.base_url, self.model, {"mode": "completions", "probe_ms": 0.0, "source": "fallback"})
+                meta["mode"] = "completions"
+            async for chunk in resp:
+                _note_usage(meta, chunk)
+                if chunk.choices and chunk.choices[0].text:
+                    yield chunk.choices[0].text
+
+    async def map(
+        self,
+        prompts: List[str],
+        temperature: float | None = None,
+        system: str | None = SYSTEM_PROMPT,
+    ) -> List[str]:
+        """Run many prompts concurrently (bounded by max_concurrency); results keep input order."""
+        return list(await asyncio.gather(
+            *(self.complete(p, temperature=temperature, system=system) for p in prompts)
+        ))
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+    async def __aenter__(self) -> "LLMSession":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+
+# One default session per event loop (httpx connections cannot cross loops)
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMSession]" = weakref.WeakKeyDictionary()
+
+
+def get_session() -> LLMSession:
+    """Default session for the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None:
+        session = _sessions[loop] = LLMSession()
+    return session
+
+
+async def acall_llm(
+    prompt: str,
+    temperature: float | None = None,
+    system: str | None = SYSTEM_PROMPT,
+    max_tokens: int | None = None,
+    cache: bool = False,
+    meta: Dict[str, Any] | None = None,
+) -> str:
+    """
+    Async counterpart of call_llm, using the running loop's pooled session.
+    Records an "llm" trace span unless the caller already opened one (meta given).
+    """
+    if meta is not None:
+        return await get_session().complete(
+            prompt, temperature=temperature, system=system, max_tokens=max_tokens, cache=cache, meta=meta
+        )
+    with span("llm", "llm") as rec:
+        return await get_session().complete(
+            prompt, temperature=temperature, system=system, max_tokens=max_tokens, cache=cache, meta=rec
+        )
+
+
+async def astream_llm(
+    prompt: str,
+    temperature: float | None = None,
+    system: str | None = SYSTEM_PROMPT,
+    max_tokens: int | None = None,
+    meta: Dict[str, Any] | None = None,
+) -> AsyncIterator[str]:
+    """Async generator of text deltas from the running loop's pooled session."""
+    async for tok in get_session().stream(prompt, temperature=temperature, system=system, max_tokens=max_tokens,
+                                          meta=meta):
+        yield tok
+
+
+# --- sync bridge ---
+# call_llm is used from plain threads (CLI, Tk workers), so blocking calls are
+# submitted to one long-lived loop; every thread then shares its connection pool.
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def _client_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-client-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine on the shared client loop and block until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, _client_loop()).result()
+
+
+_DONE = object()
+
+
+def stream_llm(
+    prompt: str,
+    temperature: float | None = None,
+    system: str | None = SYSTEM_PROMPT,
+    max_tokens: int | None = None,
+    meta: Dict[str, Any] | None = None,
+) -> Iterator[str]:
+    """
+    Blocking generator of text deltas; the stream itself runs on the shared client loop.
+    meta is filled as in LLMSession.stream (usage lands once the stream is exhausted).
+    """
+    q: "queue.Queue[Any]" = queue.Queue()
+
+    async def pump():
+        try:
+            async for tok in astream_llm(prompt, temperature=temperature, system=system, max_tokens=max_tokens,
+                                         meta=meta):
+                q.put(tok)
+        except Exception as e:
+            q.put(e)
+        finally:
+            q.put(_DONE)
+
+    fut = asyncio.run_coroutine_threadsafe(pump(), _client_loop())
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        fut.cancel()  # no-op when finished; stops the request if the consumer bailed out
+
+
+# Per-context token sink: run_pipeline installs one so that nodes calling
+# call_llm(..., stream=True) forward deltas without knowing who listens.
+_token_sink: ContextVar[Callable[[str], None] | None] = ContextVar("token_sink", default=None)
+
+
+@contextmanager
+def token_sink(fn: Callable[[str], None] | None):
+    """Route stream=True calls made inside this block to fn(text_delta)."""
+    tok = _token_sink.set(fn)
+    try:
+        yield
+    finally:
+        _token_sink.reset(tok)
+
+
+def call_llm(
+    prompt: str,
+    temperature: float | None = None,
+    system: str | None = SYSTEM_PROMPT,
+    max_tokens: int | None = None,
+    cache: bool = False,
+    stream: bool = False,
+) -> str:
+    """
+    Calls a local OpenAI-compatible /v1/chat/completions.
+    Falls back to /v1/completions if chat isn't supported.
+    Blocking wrapper over acall_llm; safe to call from any thread.
+    stream=True streams the response to the active token_sink (if any) and
+    still returns the full text.
+    """
+    sink = _token_sink.get() if stream else None
+    # The span is opened here, in the caller's thread, where the active tracer lives
+    with span("llm", "llm", stream=sink is not None) as rec:
+        if sink is None:
+            return run_sync(acall_llm(
+                prompt, temperature=temperature, system=system, max_tokens=max_tokens, cache=cache, meta=rec
+            ))
+        parts: List[str] = []
+        t0 = time.perf_counter()
+        for tok in stream_llm(prompt, temperature=temperature, system=system, max_tokens=max_tokens, meta=rec):
+            if not parts:
+                rec["first_token_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            parts.append(tok)
+            sink(tok)
+        rec["chunks"] = len(parts)
+        return "".join(parts).strip()
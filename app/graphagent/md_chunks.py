@@ -0,0 +1,212 @@
+# app/graphagent/md_chunks.py
+# Markdown-structure-aware chunking, sized in embedder tokens.
+#
+# The body is split into blocks (heading, fenced code, table, list, paragraph).
+# Chunks never cross a heading, and code, tables and lists are kept whole when
+# they fit. When they don't, they are split at line / item boundaries, with
+# code fences re-opened. Long paragraphs are split at sentences. Each chunk
+# carries its heading path ("Guide > Install > Windows") for the chunk metadata.
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(`{3,}|~{3,})")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_SENT_END = re.compile(r"(?<=[.!?])\s+")
+
+TOKEN_RESERVE = 8  # [CLS]/[SEP] and the "passage: " prefix some models get
+
+
+@lru_cache(maxsize=8)
+def token_counter(model_name: str) -> Tuple[Callable[[str], int], int]:
+    """
+    (count_tokens, window) for the embedder's tokenizer, loaded once per process.
+    Without transformers (or offline) falls back to ~4 chars per token and a 512 window.
+    """
+    try:
+        from transformers import AutoTokenizer
+        tok = AutoTokenizer.from_pretrained(model_name)
+        window = tok.model_max_length if 0 < tok.model_max_length < 100_000 else 512
+
+        def count(text: str) -> int:
+            return len(tok(text, add_special_tokens=False, verbose=False)["input_ids"])
+        return count, window
+    except Exception:
+        return (lambda text: (len(text) + 3) // 4), 512
+
+
+def markdown_blocks(body: str) -> List[Tuple[str, str, List[str]]]:
+    """[(kind, text, heading path)] with kind in heading|code|table|list|para."""
+    lines = body.replace("\r", "").split("\n")
+    blocks: List[Tuple[str, str, List[str]]] = []
+    path: List[Tuple[int, str]] = []
+    i, n = 0, len(lines)
+
+    def heads() -> List[str]:
+        return [t for _, t in path]
+
+    while i < n:
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+        m = _FENCE.match(line)
+        if m:
+            fence, j = m.group(1), i + 1
+            while j < n and not lines[j].lstrip().startswith(fence):
+                j += 1
+            blocks.append(("code", "\n".join(lines[i:j + 1]), heads()))
+            i = j + 1
+            continue
+        m = _HEADING.match(line)
+        if m:
+            level = len(m.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, m.group(2)))
+            blocks.append(("heading", line.strip(), heads()))
+            i += 1
+            continue
+        j = i + 1
+        if line.lstrip().startswith("|"):
+            kind = "table"
+            while j < n and lines[j].lstrip().startswith("|"):
+                j += 1
+        elif _LIST_ITEM.match(line):
+            kind = "list"
+            while j < n:
+                nxt = lines[j]
+                if nxt.strip() and (_LIST_ITEM.match(nxt) or nxt[:1] in (" ", "\t")):
+                    j += 1
+                elif not nxt.strip() and j + 1 < n and (_LIST_ITEM.match(lines[j + 1]) or lines[j + 1][:1] in (" ", "\t")):
+                    j += 1  # blank line inside a loose list
+                else:
+                    break
+        else:
+            kind = "para"
+            while j < n and lines[j].strip() and not (
+                _HEADING.match(lines[j]) or _FENCE.match(lines[j]) or lines[j].lstrip().startswith("|")
+                or _LIST_ITEM.match(lines[j])
+            ):
+                j += 1
+        blocks.append((kind, "\n".join(lines[i:j]).strip("\n"), heads()))
+        i = j
+    return blocks
+
+
+def _hard_split(text: str, max_tokens: int, count: Callable[[str], int]) -> List[str]:
+    """Last resort for a single line/sentence over budget: split between words."""
+    out: List[str] = []
+    cur: List[str] = []
+    for w in text.split(" "):
+        if cur and count(" ".join(cur + [w])) > max_tokens:
+            out.append(" ".join(cur))
+            cur = []
+        cur.append(w)
+    if cur:
+        out.append(" ".join(cur))
+    return out
+
+
+def _pack(units: List[str], sep: str, max_tokens: int, count: Callable[[str], int]) -> List[str]:
+    """Greedy packing by running token sums (+1 per separator, which errs on the safe side)."""
+    out: List[str] = []
+    cur: List[str] = []
+    used = 0
+    for u in units:
+        t = count(u)
+        if t > max_tokens:
+            if cur:
+                out.append(sep.join(cur))
+                cur, used = [], 0
+            out.extend(_hard_split(u, max_tokens, count))
+            continue
+        if cur and used + 1 + t > max_tokens:
+            out.append(sep.join(cur))
+            cur, used = [], 0
+        used += t + (1 if cur else 0)
+        cur.append(u)
+    if cur:
+        out.append(sep.join(cur))
+    return out
+
+
+def _split_block(kind: str, text: str, max_tokens: int, count: Callable[[str], int],
+                 sentences: Callable[[str], List[str]]) -> List[str]:
+    """Pieces of an over-budget block, each within max_tokens."""
+    if kind == "code":
+        lines = text.split("\n")
+        opener = lines[0]
+        closer = lines[-1] if len(lines) > 1 and _FENCE.match(lines[-1]) else ""
+        inner = lines[1:-1] if closer else lines[1:]
+        budget = max(1, max_tokens - count(opener) - count(closer) - 2)
+        return [opener + "\n" + piece + ("\n" + closer if closer else "") for piece in _pack(inner, "\n", budget, count)]
+    if kind == "table":
+        lines = text.split("\n")
+        header = "\n".join(lines[:2]) if len(lines) > 2 else ""
+        rows = lines[2:] if header else lines
+        budget = max(1, max_tokens - count(header) - 1) if header else max_tokens
+        return [(header + "\n" + piece) if header else piece for piece in _pack(rows, "\n", budget, count)]
+    if kind == "list":
+        items: List[str] = []
+        for line in text.split("\n"):
+            if not items or (_LIST_ITEM.match(line) and not line[:1].isspace()):
+                items.append(line)
+            else:
+                items[-1] += "\n" + line
+        return _pack(items, "\n", max_tokens, count)
+    return _pack([s.strip() for s in sentences(text) if s.strip()], " ", max_tokens, count)
+
+
+def _simple_sentences(text: str) -> List[str]:
+    return _SENT_END.split(text)
+
+
+def markdown_chunks(
+    body: str,
+    max_tokens: int,
+    overlap_pct: float,
+    count: Callable[[str], int],
+    sentences: Callable[[str], List[str]] = _simple_sentences,
+) -> List[Tuple[str, str]]:
+    """
+    [(chunk text, heading path)]. Blocks of one section are joined with blank lines up to
+    max_tokens; a new chunk in the same section starts with the trailing whole units of the
+    previous one that fit in overlap_pct * max_tokens.
+    """
+    overlap_tokens = int(max_tokens * overlap_pct)
+    chunks: List[Tuple[str, str]] = []
+    cur: List[Tuple[str, int]] = []  # (unit, tokens) of the open chunk
+    cur_path = ""
+
+    def size(units: List[Tuple[str, int]]) -> int:
+        return sum(t for _, t in units) + max(0, len(units) - 1)
+
+    def flush() -> None:
+        text = "\n\n".join(u for u, _ in cur).strip()
+        if text:
+            chunks.append((text, cur_path))
+
+    for kind, text, heads in markdown_blocks(body):
+        path = " > ".join(heads)
+        if kind == "heading" or path != cur_path:
+            flush()
+            cur, cur_path = [], path
+        t = count(text)
+        units = [text] if t <= max_tokens else _split_block(kind, text, max_tokens, count, sentences)
+        for u in units:
+            ut = t if len(units) == 1 else count(u)
+            if cur and size(cur) + 1 + ut > max_tokens:
+                flush()
+                carry: List[Tuple[str, int]] = []
+                for prev in reversed(cur):
+                    if size([prev] + carry) > overlap_tokens or size([prev] + carry) + 1 + ut > max_tokens:
+                        break
+                    carry.insert(0, prev)
+                cur = carry
+            cur.append((u, ut))
+    flush()
+    return chunks
@@ -0,0 +1,210 @@
+# app/graphagent/mmap_store.py
+# Memory-mapped export of a Chroma collection, so every process (CLI subprocesses,
+# Gradio workers, batch threads) shares one page-cache copy of the vectors.
+#
+# Layout under <db_dir>/_mmap/<collection>@<version>/ (the manifest's "mmap_export" names the current one):
+#   vectors.npy   (n, dim) float32|float16, opened with np.load(mmap_mode="r")
+#   offsets.npy   (n + 1,) int64 byte offsets of each row's line in rows.jsonl
+#   rows.jsonl    one {"id", "document", "metadata"} per row, read lazily through mmap
+#   meta.json     {"collection", "count", "dim", "dtype", "model_name", "source_updated_at", ...}
+# Every export is written to a new version dir and never replaced in place: a process that
+# still has the old vectors.npy mapped keeps reading it (Windows refuses to delete or
+# replace a mapped file). Old versions are removed best-effort after each export.
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+from .config import RAG_DB_DIR, RAG_MMAP_DTYPE
+
+MMAP_DIRNAME = "_mmap"
+EXPORT_KEY = "mmap_export"  # manifest field: version dir name of the current export
+
+
+def manifest_path(db_dir: str, name: str) -> str:
+    return os.path.join(db_dir, "_collections", f"{name}.json")
+
+
+def read_manifest(db_dir: str, name: str) -> Dict[str, Any]:
+    path = manifest_path(db_dir, name)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def write_manifest(db_dir: str, name: str, data: Dict[str, Any]) -> str:
+    """Replace _collections/<name>.json atomically (readers never see a half-written file)."""
+    path = manifest_path(db_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def update_manifest(db_dir: str, name: str, key: str, value: Any) -> Dict[str, Any]:
+    """Set one top-level key of the manifest, keeping the others (export pointer, "ann", "quant", ...)."""
+    man = read_manifest(db_dir, name)
+    man[key] = value
+    write_manifest(db_dir, name, man)
+    return man
+
+
+def export_dir(db_dir: str, name: str) -> str:
+    """The current export version dir (the unversioned <name>/ of older exports when none is recorded)."""
+    return os.path.join(db_dir, MMAP_DIRNAME, read_manifest(db_dir, name).get(EXPORT_KEY) or name)
+
+
+def prune_exports(db_dir: str, name: str, keep: str) -> List[str]:
+    """
+    Remove export versions of name other than keep, best-effort: a version some process
+    still has mapped cannot be deleted on Windows and is retried after the next export.
+    Returns the version dirs that could not be removed completely.
+    """
+    root = os.path.join(db_dir, MMAP_DIRNAME)
+    version = re.compile(re.escape(name) + r"(@\d+)?(\.tmp)?")
+    left: List[str] = []
+    for entry in os.listdir(root) if os.path.isdir(root) else []:
+        if entry == keep or not version.fullmatch(entry):
+            continue
+        path = os.path.join(root, entry)
+        shutil.rmtree(path, ignore_errors=True)
+        if os.path.exists(path):
+            left.append(entry)
+    return left
+
+
+class RowTable:
+    """Read-only sequence over rows.jsonl; row i is parsed only when accessed."""
+
+    def __init__(self, path: str, offsets: np.ndarray):
+        self._f = open(path, "rb")
+        size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._off = offsets
+
+    def __len__(self) -> int:
+        return len(self._off) - 1
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return json.loads(self._mm[int(self._off[i]):int(self._off[i + 1])])
+
+    def close(self) -> None:
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._f.close()
+
+
+def _chroma_pages(db_dir: str, name: str, page: int) -> Iterator[Dict[str, Any]]:
+    import chromadb
+    coll = chromadb.PersistentClient(path=db_dir).get_collection(name)
+    total = coll.count()
+    for offset in range(0, total, page):
+        got = coll.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=offset)
+        got["total"] = total
+        yield got
+
+
+def export_collection(db_dir: str, name: str, dtype: str = RAG_MMAP_DTYPE, page: int = 5000) -> Dict[str, Any]:
+    """
+    Write a new version dir <db_dir>/_mmap/<name>@<ns>/ from the Chroma collection, page
+    by page (the full matrix is never held in memory). Once complete, the manifest is
+    pointed at it and older versions are pruned. Returns the meta.json contents.
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Unsupported dtype '{dtype}' (use float32 or float16).")
+    version = f"{name}@{time.time_ns()}"
+    out = os.path.join(db_dir, MMAP_DIRNAME, version)
+    os.makedirs(out)
+
+    man = read_manifest(db_dir, name)
+    vectors = None
+    offsets: List[int] = [0]
+    row = 0
+    dim = 0
+    with open(os.path.join(out, "rows.jsonl"), "wb") as rows:
+        for got in _chroma_pages(db_dir, name, page):
+            emb = np.asarray(got["embeddings"], dtype=np.float32)
+            if vectors is None:
+                dim = int(emb.shape[1])
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(out, "vectors.npy"), mode="w+", dtype=dtype, shape=(got["total"], dim)
+                )
+            vectors[row:row + len(emb)] = emb
+            docs = got["documents"] or [""] * len(got["ids"])
+            metas = got["metadatas"] or [{}] * len(got["ids"])
+            for cid, doc, meta in zip(got["ids"], docs, metas):
+                line = json.dumps({"id": cid, "document": doc, "metadata": meta or {}}, ensure_ascii=False)
+                rows.write(line.encode("utf-8") + b"\n")
+                offsets.append(rows.tell())
+            row += len(emb)
+    if vectors is None:
+        vectors = np.lib.format.open_memmap(os.path.join(out, "vectors.npy"), mode="w+", dtype=dtype, shape=(0, 0))
+    vectors.flush()
+    del vectors
+    np.save(os.path.join(out, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+    meta = {
+        "collection": name,
+        "count": row,
+        "dim": dim,
+        "dtype": dtype,
+        "model_name": man.get("model_name", ""),
+        "source_updated_at": man.get("updated_at"),
+        "exported_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "version": version,
+    }
+    with open(os.path.join(out, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    update_manifest(db_dir, name, EXPORT_KEY, version)
+    meta["stale_versions"] = prune_exports(db_dir, name, keep=version)
+    return meta
+
+
+def open_export(db_dir: str, name: str) -> Dict[str, Any] | None:
+    """
+    {"meta", "path" (version dir), "vectors" (read-only memmap), "rows" (RowTable)} for an
+    export that is current with the collection manifest, else None (caller falls back to Chroma).
+    """
+    man = read_manifest(db_dir, name)
+    d = os.path.join(db_dir, MMAP_DIRNAME, man.get(EXPORT_KEY) or name)
+    meta_path = os.path.join(d, "meta.json")
+    if not os.path.isfile(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if man.get("updated_at") and man["updated_at"] != meta.get("source_updated_at"):
+        return None  # collection re-embedded since this export
+    offsets = np.load(os.path.join(d, "offsets.npy"))
+    return {
+        "meta": meta,
+        "path": d,
+        "vectors": np.load(os.path.join(d, "vectors.npy"), mmap_mode="r"),
+        "rows": RowTable(os.path.join(d, "rows.jsonl"), offsets),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export a Chroma collection as memory-mapped vectors.")
+    ap.add_argument("collection", help="Collection name, e.g. markdown_chunks_bge_s650_o15")
+    ap.add_argument("--db-dir", default=RAG_DB_DIR)
+    ap.add_argument("--dtype", choices=["float32", "float16"], default=RAG_MMAP_DTYPE)
+    args = ap.parse_args()
+    meta = export_collection(args.db_dir, args.collection, dtype=args.dtype)
+    print(json.dumps(meta, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,18 @@
 # app/graphagent/pipeline.py
+from __future__ import annotations
+
+import os
+from contextlib import nullcontext
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Tuple, Callable
 
+import yaml
+
 # --- Pull in the real State and node registry from core -----------------------
 try:
     from app.graphagent.core import State, NODE_REGISTRY  # nodes live in core.py
+    from app.graphagent.llm_client import token_sink
+    from app.graphagent.tracing import span
 except ImportError:
     # Fallback State (matches core.State fields that the CLI relies on)
     @dataclass
@@ -16,9 +24,17 @@ except ImportError:
         result: str = ""
         step: int = 0
         done: bool = False
+        visited: List[str] = field(default_factory=list)
+        route_log: List[str] = field(default_factory=list)
 
     NODE_REGISTRY: Dict[str, Callable[[Any], str]] = {}
 
+    def token_sink(fn):
+        return nullcontext()
+
+    def span(name, kind, **attrs):
+        return nullcontext({})
+
 # Type alias for readability
 NodeFn = Callable[[State], str]
 
@@ -100,35 +116,84 @@ class RAGEnrich:
 # ----- Functions that cli.py imports -----------------------------------------
 # ------------------------------------------------------------------------------
 
+PIPELINES_DIR = os.path.join(os.path.dirname(__file__), "pipelines")
+EXEC_MODE = os.environ.get("GRAPHAGENT_EXEC_MODE", "sequential").lower()   # "sequential" | "dag"
+
 def load_pipeline(name: str = "default") -> Dict[str, Any]:
     """
     Returns a minimal 'spec' the rest of this file understands.
-    Nodes themselves are in app.graphagent.core (NODE_REGISTRY).
+    Nodes themselves are in app.graphagent.core (NODE_REGISTRY); start/edges/mode
+    come from pipelines/<name>.yaml when that file exists.
     """
     if not NODE_REGISTRY:
         raise RuntimeError("NODE_REGISTRY is empty. Did core.py import correctly?")
+    cfg: Dict[str, Any] = {}
+    path = os.path.join(PIPELINES_DIR, f"{name}.yaml")
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
     return {
         "name": name,
-        "start": "plan",
+        "start": cfg.get("start", "plan"),
         "nodes": NODE_REGISTRY,   # dict[str, NodeFn]
-        # You can stash options here later if desired.
+        "edges": cfg.get("edges", {}),
+        "mode": str(cfg.get("mode", EXEC_MODE)).lower(),
     }
 
-def run_pipeline(task: str, spec: Dict[str, Any], max_steps: int = 50) -> State:
+def run_pipeline(
+    task: str,
+    spec: Dict[str, Any],
+    max_steps: int = 50,
+    on_node: Callable[[str], None] | None = None,
+    on_token: Callable[[str, str], None] | None = None,
+    mode: str | None = None,
+    checkpoint: Any = None,
+    run_id: str | None = None,
+) -> State:
     """
     Simple driver: start at 'plan' and follow the node names returned by each node
     until a node returns 'end' (or state.done is set).
+    on_node(name) fires before each node; on_token(name, delta) receives streamed
+    LLM output from nodes that stream (write, critic).
+    mode="dag" (or spec["mode"]) runs independent branches in parallel instead;
+    see app.graphagent.dag. The loop below is the sequential compatibility mode.
+    checkpoint (a checkpoint.CheckpointStore) + run_id snapshot State and the next
+    node after every node; if run_id already has snapshots the run resumes there.
     """
-    nodes: Dict[str, NodeFn] = spec["nodes"]
     current = spec.get("start", "plan")
     state = State(task=task)
+    after_node = None
+    if checkpoint is not None and run_id:
+        saved = checkpoint.load(run_id)
+        if saved:
+            state, current = saved
+        after_node = lambda st, node, nxt: checkpoint.save(run_id, st, node, nxt)
+    if current in ("", "end", "done", "stop"):
+        return state
+
+    if (mode or spec.get("mode") or "sequential") == "dag":
+        from app.graphagent.dag import run_dag
+        return run_dag(
+            task, spec, max_steps=max_steps, on_node=on_node, on_token=on_token,
+            state=state, start=current, after_node=after_node,
+        )
+
+    nodes: Dict[str, NodeFn] = spec["nodes"]
 
     while not getattr(state, "done", False) and state.step < max_steps:
         fn = nodes.get(current)
         if fn is None:
             raise RuntimeError(f"Unknown node '{current}' in pipeline.")
-        next_name = (fn(state) or "").strip().lower()
+        if on_node:
+            on_node(current)
+        state.visited.append(current)
+        sink = (lambda t, n=current: on_token(n, t)) if on_token else None
+        with token_sink(sink), span(current, "node", step=state.step) as rec:
+            next_name = (fn(state) or "").strip().lower()
+            rec["next"] = next_name
         state.step += 1
+        if after_node:
+            after_node(state, current, next_name or "end")
 
         if next_name in ("", "end", "done", "stop"):
             break
@@ -0,0 +1,143 @@
+# app/graphagent/quant.py
+# Scalar-quantized (int8) copy of an mmap_store export for first-pass dense scoring.
+#   vectors_int8.npy  (n, dim) int8, row i = round(v_i / scale_i), scale_i = max|v_i| / 127
+#   scales.npy        (n,) float32
+# The int8 matrix is what stays hot (1/4 of float32); the top k * rescore candidates are
+# rescored exactly against the float vectors.npy memmap, so only those rows are paged in.
+# Memory and recall vs exact search go into _collections/<name>.json ("quant").
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from .ann_index import as_f32, measure_recall, self_query_truth, top_k
+from .config import RAG_DB_DIR, RAG_QUANT_RESCORE
+
+QUANT_FILES = ("vectors_int8.npy", "scales.npy")
+
+
+def quantize_export(export_path: str, vectors: np.ndarray, block: int = 65536) -> Dict[str, Any]:
+    """Write the int8 matrix and per-row scales next to the export, block by block."""
+    n, dim = (int(vectors.shape[0]), int(vectors.shape[1])) if vectors.ndim == 2 else (0, 0)
+    q = np.lib.format.open_memmap(os.path.join(export_path, "vectors_int8.npy.tmp"), mode="w+", dtype=np.int8,
+                                  shape=(n, dim))
+    scales = np.empty(n, dtype=np.float32)
+    for s in range(0, n, block):
+        v = as_f32(vectors[s:s + block])
+        sc = np.abs(v).max(axis=1) / 127.0
+        sc[sc == 0] = 1.0
+        q[s:s + block] = np.clip(np.rint(v / sc[:, None]), -127, 127).astype(np.int8)
+        scales[s:s + block] = sc
+    q.flush()
+    del q
+    np.save(os.path.join(export_path, "scales.npy"), scales)
+    os.replace(os.path.join(export_path, "vectors_int8.npy.tmp"), os.path.join(export_path, "vectors_int8.npy"))
+    return {"rows": n, "dim": dim}
+
+
+class QuantizedVectors:
+    """int8 first pass + exact float rescoring over an export."""
+
+    def __init__(self, q: np.ndarray, scales: np.ndarray, vectors: np.ndarray, rescore: int = RAG_QUANT_RESCORE):
+        self.q = q              # (n, dim) int8
+        self.scales = scales    # (n,) float32
+        self.vectors = vectors  # (n, dim) float32|float16 memmap, read only for candidates
+        self.rescore = max(1, int(rescore))
+
+    @classmethod
+    def load(cls, export_path: str, vectors: np.ndarray, rescore: int = RAG_QUANT_RESCORE) -> "QuantizedVectors":
+        return cls(np.load(os.path.join(export_path, "vectors_int8.npy"), mmap_mode="r"),
+                   np.load(os.path.join(export_path, "scales.npy")), vectors, rescore)
+
+    def approx_scores(self, q: np.ndarray, block: int = 8192) -> np.ndarray:
+        # small blocks: the float32 upcast of each block stays cache-sized
+        out = np.empty(self.q.shape[0], dtype=np.float32)
+        for s in range(0, self.q.shape[0], block):
+            out[s:s + block] = (self.q[s:s + block].astype(np.float32) @ q) * self.scales[s:s + block]
+        return out
+
+    def search(self, q: np.ndarray, k: int, rescore: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(row indexes, exact scores) of the k best rows among the top k * rescore int8 candidates."""
+        cand = top_k(self.approx_scores(q), k * (rescore or self.rescore))
+        if not len(cand):
+            return cand, np.zeros(0, dtype=np.float32)
+        rows = np.sort(cand)  # sequential reads from the memmap
+        exact = as_f32(self.vectors[rows]) @ q
+        order = top_k(exact, k)
+        return rows[order], exact[order]
+
+    def nbytes(self) -> int:
+        return int(self.q.size + self.scales.nbytes)
+
+
+def quant_report(qv: QuantizedVectors, k: int = 40, queries: int = 200, seed: int = 1) -> Dict[str, Any]:
+    """Recall@k vs exact float search for the int8 first pass alone (rescore 0) and for each rescoring factor."""
+    qs, truth, exact_ms = self_query_truth(qv.vectors, k, queries, seed)
+    rows = []
+    searches = [(0, lambda q: top_k(qv.approx_scores(q), k))]
+    searches += [(m, lambda q, m=m: qv.search(q, k, rescore=m)[0]) for m in sorted({1, 2, 4, 8, qv.rescore})]
+    for m, search in searches:
+        r = measure_recall(qs, truth, k, search)
+        rows.append(dict(rescore=m, recall_delta=round(r["recall"] - 1.0, 4), **r))
+    return {"k": k, "queries": int(len(qs)), "exact_mean_ms": round(exact_ms, 3), "settings": rows}
+
+
+def quantize_collection(db_dir: str, name: str, k: int = 40) -> Dict[str, Any]:
+    """Quantize the collection's mmap export, evaluate it and record it in the manifest ("quant")."""
+    from .mmap_store import open_export, update_manifest
+    exp = open_export(db_dir, name)
+    if exp is None:
+        raise RuntimeError(f"No current mmap export for '{name}'; run mmap_store.export_collection first.")
+    d = exp["path"]
+    vectors = exp["vectors"]
+    t0 = time.perf_counter()
+    quantize_export(d, vectors)
+    build_sec = time.perf_counter() - t0
+    qv = QuantizedVectors.load(d, vectors)
+
+    report = quant_report(qv, k=k)
+    f32_bytes = int(vectors.shape[0] * (vectors.shape[1] if vectors.ndim == 2 else 0) * 4)
+    at_rescore = next((r for r in report["settings"] if r["rescore"] == qv.rescore), {})
+    info = {
+        "kind": "int8",
+        "rows": int(vectors.shape[0]),
+        "build_sec": round(build_sec, 2),
+        "built_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "rescore": qv.rescore,
+        "memory": {
+            "float32_bytes": f32_bytes,
+            "export_bytes": int(vectors.nbytes),
+            "int8_bytes": qv.nbytes(),
+            "savings_vs_float32": round(1 - qv.nbytes() / f32_bytes, 4) if f32_bytes else 0.0,
+        },
+        "recall_delta": at_rescore.get("recall_delta"),
+        "report": report,
+    }
+    update_manifest(db_dir, name, "quant", info)
+    return info
+
+
+def load_quant(export_path: str, vectors: np.ndarray) -> QuantizedVectors | None:
+    """The export's int8 copy, or None when it was not built."""
+    if not all(os.path.isfile(os.path.join(export_path, f)) for f in QUANT_FILES):
+        return None
+    return QuantizedVectors.load(export_path, vectors)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build an int8 copy of a collection's vectors and report memory/recall.")
+    ap.add_argument("collection")
+    ap.add_argument("--db-dir", default=RAG_DB_DIR)
+    ap.add_argument("--k", type=int, default=40, help="recall@k to evaluate (recall_k used by node_research)")
+    args = ap.parse_args()
+    print(json.dumps(quantize_collection(args.db_dir, args.collection, k=args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 # app/graphagent/rag_integration.py
 import os, sys
-RAG_HOME = os.environ.get("RAG_HOME", r"C:\Users\gmoores\Desktop\AI\RAG")
-if RAG_HOME and RAG_HOME not in sys.path:
-    sys.path.insert(0, RAG_HOME)
+from typing import Dict, Any, List
+
+from .config import RAG_BACKEND
+from .tracing import span
+
+if RAG_BACKEND == "builtin":
+    from . import retrieval as _backend
+else:
+    RAG_HOME = os.environ.get("RAG_HOME", r"C:\Users\gmoores\Desktop\AI\RAG")
+    if RAG_HOME and RAG_HOME not in sys.path:
+        sys.path.insert(0, RAG_HOME)
+    from rag_core import query_rag_system as _backend
+
+# True when the backend can serve several queries in one call (search_many)
+BATCH_SEARCH = hasattr(_backend, "search_many")
 
-from typing import Dict, Any
-from rag_core import query_rag_system
 
 def search_docs(
     query: str,
@@ -15,12 +25,48 @@ def search_docs(
     context_k: int,
     rerank: bool = True,
 ) -> Dict[str, Any]:
-    """Thin shim around rag_core.query_rag_system.search."""
-    return query_rag_system.search(
-        query=query,
-        profile=profile,
-        recall_k=recall_k,
-        rerank_k=rerank_k,
-        context_k=context_k,
-        rerank=rerank,
-    )
+    """Thin shim around the configured backend's search (rag_core or built-in)."""
+    with span("search_docs", "retrieval", query=query[:120], profile=profile, recall_k=recall_k,
+              backend=RAG_BACKEND) as rec:
+        out = _backend.search(
+            query=query,
+            profile=profile,
+            recall_k=recall_k,
+            rerank_k=rerank_k,
+            context_k=context_k,
+            rerank=rerank,
+        )
+        rec["results"] = len((out or {}).get("results", []) or []) if isinstance(out, dict) else None
+        return out
+
+
+def search_docs_many(
+    queries: List[str],
+    profile: str,
+    recall_k: int,
+    rerank_k: int,
+    context_k: int,
+    rerank: bool = True,
+) -> List[Dict[str, Any]]:
+    """search_docs for several queries; one batched query encode with the built-in backend."""
+    with span("search_docs_many", "retrieval", queries=len(queries), profile=profile, recall_k=recall_k,
+              backend=RAG_BACKEND) as rec:
+        if BATCH_SEARCH:
+            outs = _backend.search_many(queries, profile=profile, recall_k=recall_k, rerank_k=rerank_k,
+                                        context_k=context_k, rerank=rerank)
+        else:
+            outs = [_backend.search(query=q, profile=profile, recall_k=recall_k, rerank_k=rerank_k,
+                                    context_k=context_k, rerank=rerank) for q in queries]
+        rec["results"] = sum(len((o or {}).get("results", []) or []) for o in outs)
+        return outs
+
+
+def cache_stats() -> Dict[str, Any] | None:
+    """Retrieval cache counters ({"query": ..., "rerank": ...}; None for backends without caches)."""
+    fn = getattr(_backend, "cache_stats", None)
+    return fn() if fn else None
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Profiles available to search_docs: [{"profile": ..., ...}]."""
+    return _backend.list_profiles()
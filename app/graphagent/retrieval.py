@@ -0,0 +1,483 @@
+# app/graphagent/retrieval.py
+# In-process retrieval over the Chroma collections written by
+# create_chroma_collections_gui.run_embed. Same contract as
+# rag_core.query_rag_system (search / list_profiles); select with RAG_BACKEND=builtin.
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .config import (
+    RAG_DB_DIR, RAG_BASE, RAG_RERANKER_MODEL, RAG_MMAP, RAG_HYBRID, RAG_RRF_K, RAG_LEXICAL_K, RAG_QUERY_CACHE,
+    RAG_RERANK_CACHE, RAG_RERANK_BATCH, RAG_RERANK_TOP_M, RAG_RERANK_MIN_SCORE, RAG_QUANT,
+)
+from .ann_index import dense_scores, load_index, top_k
+from .bm25 import BM25Index, rrf
+from .mmap_store import manifest_path, open_export, read_manifest
+from .quant import load_quant
+from .tracing import span
+
+
+# --- collections ---
+@dataclass
+class Collection:
+    name: str
+    profile: str
+    model_name: str
+    rows: Sequence[Dict[str, Any]]  # row i -> {"id", "document", "metadata"}
+    embeddings: np.ndarray          # (n, dim) L2-normalised by embed_passages; may be a float16 memmap
+    source: str = "chroma"          # "chroma" (loaded into memory) or "mmap" (shared export)
+    ann: Any = None                 # ann_index IVFIndex/HNSWIndex over the mmap export, if built
+    export_path: str = ""           # mmap_store export dir ("" when loaded from Chroma)
+    bm25: Any = None                # BM25Index over documents, keyed by row index (built on first hybrid search)
+    quant: Any = None               # quant.QuantizedVectors (int8 first pass + float rescoring), if built
+    stamp: int | None = None        # manifest mtime at load; a newer manifest means the collection was rewritten
+
+
+_collections: Dict[Tuple[str, str], Collection] = {}
+_models: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def collection_name(profile: str, base: str = RAG_BASE) -> str:
+    if not profile or profile == "_legacy":
+        return base
+    return f"{base}_{profile}"
+
+
+def _manifest_stamp(db_dir: str, name: str) -> int | None:
+    # ingest, the mmap export, the ANN build and quantization all rewrite the manifest
+    try:
+        return os.stat(manifest_path(db_dir, name)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load_from_chroma(db_dir: str, name: str, page: int = 5000) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    import chromadb
+    coll = chromadb.PersistentClient(path=db_dir).get_collection(name)
+    total = coll.count()
+    rows: List[Dict[str, Any]] = []
+    vecs: List[np.ndarray] = []
+    for offset in range(0, total, page):
+        got = coll.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=offset)
+        docs = got["documents"] or [""] * len(got["ids"])
+        metas = got["metadatas"] or [{}] * len(got["ids"])
+        rows.extend({"id": i, "document": d, "metadata": m or {}} for i, d, m in zip(got["ids"], docs, metas))
+        vecs.append(np.asarray(got["embeddings"], dtype=np.float32))
+    emb = np.vstack(vecs) if vecs else np.zeros((0, 0), dtype=np.float32)
+    return rows, emb
+
+
+def load_collection(profile: str, db_dir: str = RAG_DB_DIR, base: str = RAG_BASE) -> Collection:
+    """
+    Load a profile's collection, cached per process until its manifest changes (a
+    re-embed, incremental ingest or index build in any process reloads it on the next
+    search). A current mmap_store export is mapped read-only (shared page cache,
+    near-instant); otherwise Chroma is read into an in-memory NumPy matrix.
+    """
+    name = collection_name(profile, base)
+    key = (db_dir, name)
+    stamp = _manifest_stamp(db_dir, name)
+    with _lock:
+        coll = _collections.get(key)
+    if coll is not None and coll.stamp == stamp:
+        return coll
+
+    man = read_manifest(db_dir, name)
+    exp = open_export(db_dir, name) if RAG_MMAP else None
+    if exp is not None:
+        coll = Collection(name=name, profile=profile,
+                          model_name=man.get("model_name") or exp["meta"].get("model_name", ""),
+                          rows=exp["rows"], embeddings=exp["vectors"], source="mmap",
+                          ann=load_index(exp["path"], man), export_path=exp["path"],
+                          quant=load_quant(exp["path"], exp["vectors"]) if RAG_QUANT != "off" else None)
+    else:
+        rows, emb = _load_from_chroma(db_dir, name)
+        model_name = man.get("model_name") or (rows[0]["metadata"].get("model_name") if rows else "") or ""
+        coll = Collection(name=name, profile=profile, model_name=model_name, rows=rows, embeddings=emb)
+    coll.stamp = stamp
+    with _lock:
+        cur = _collections.get(key)
+        if cur is not None and cur.stamp == stamp:
+            _release(coll)
+            return cur  # another thread loaded the same version first
+        _collections[key] = coll
+    if cur is not None:
+        _release(cur)
+    return coll
+
+
+def _release(coll: Collection) -> None:
+    """Close a dropped collection's mmap'd rows.jsonl so prune_exports can delete the export (Windows)."""
+    close = getattr(coll.rows, "close", None)
+    if close is not None:
+        close()
+
+
+def invalidate(profile: str | None = None, db_dir: str = RAG_DB_DIR, base: str = RAG_BASE) -> None:
+    """Drop cached collections (all, or one profile) so the next search reloads them."""
+    with _lock:
+        if profile is None:
+            dropped = list(_collections.values())
+            _collections.clear()
+        else:
+            dropped = [c for c in [_collections.pop((db_dir, collection_name(profile, base)), None)] if c is not None]
+    for coll in dropped:
+        _release(coll)
+
+
+# --- models ---
+def _model(kind: str, name: str):
+    key = f"{kind}:{name}"
+    with _lock:
+        m = _models.get(key)
+    if m is None:
+        if kind == "embed":
+            from sentence_transformers import SentenceTransformer
+            m = SentenceTransformer(name)
+        else:
+            from sentence_transformers import CrossEncoder
+            m = CrossEncoder(name)
+        with _lock:
+            m = _models.setdefault(key, m)
+    return m
+
+
+def query_prefix(model_name: str) -> str:
+    # counterpart of the "passage: " prefix embed_passages adds for bge/e5 models
+    lower = model_name.lower()
+    return "query: " if ("bge" in lower or "e5" in lower) else ""
+
+
+class LRU:
+    """Thread-safe bounded mapping with hit/miss counters."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(0, int(max_entries))
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Any, value: Any) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+            }
+
+
+_query_vecs = LRU(RAG_QUERY_CACHE)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").split())
+
+
+def encode_queries(model_name: str, queries: List[str]) -> np.ndarray:
+    """
+    (len(queries), dim) query embeddings. Cached per (model_name, normalized query);
+    all misses are encoded together in one model.encode call.
+    """
+    keys = [(model_name, normalize_query(q)) for q in queries]
+    vecs: List[np.ndarray | None] = [_query_vecs.get(k) for k in keys]
+    missing = list(dict.fromkeys(k for k, v in zip(keys, vecs) if v is None))
+    if missing:
+        prefix = query_prefix(model_name)
+        enc = _model("embed", model_name).encode(
+            [prefix + q for _, q in missing], normalize_embeddings=True, show_progress_bar=False
+        )
+        fresh = dict(zip(missing, np.asarray(enc, dtype=np.float32)))
+        for k, v in fresh.items():
+            _query_vecs.put(k, v)
+        vecs = [v if v is not None else fresh[k] for k, v in zip(keys, vecs)]
+    return np.vstack(vecs) if vecs else np.zeros((0, 0), dtype=np.float32)
+
+
+def encode_query(model_name: str, query: str) -> np.ndarray:
+    return encode_queries(model_name, [query])[0]
+
+
+# --- search stages ---
+def dense_recall(coll: Collection, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (row indexes, scores) of the k best rows: ANN index when the collection has one, else the
+    int8 scan + exact rescoring when quantized, else an exact scan.
+    """
+    if coll.ann is not None:
+        return coll.ann.search(coll.embeddings, q, k)
+    if coll.quant is not None:
+        return coll.quant.search(q, k)
+    scores = dense_scores(coll.embeddings, q)
+    idx = top_k(scores, k)
+    return idx, scores[idx]
+
+
+def lexical_index(coll: Collection) -> BM25Index:
+    """
+    The collection's BM25 index: loaded from the mmap export (bm25.pkl) when
+    present, else built once from the rows and saved next to the export.
+    Loading/building happens outside _lock so searches on other collections are
+    not blocked; if two threads race, the first one published wins.
+    """
+    if coll.bm25 is not None:
+        return coll.bm25
+    path = os.path.join(coll.export_path, "bm25.pkl") if coll.export_path else ""
+    index = None
+    if path and os.path.isfile(path):
+        try:
+            index = BM25Index.load(path)
+        except Exception:
+            index = None
+    built = index is None or len(index) != len(coll.rows)
+    if built:
+        index = BM25Index()
+        for i in range(len(coll.rows)):
+            index.add(i, coll.rows[i].get("document") or "")
+    with _lock:
+        if coll.bm25 is not None:
+            return coll.bm25
+        coll.bm25 = index
+    if built and path:
+        try:
+            index.save(path)
+        except OSError:
+            pass  # read-only export dir: keep the in-process index
+    return index
+
+
+def hybrid_recall(coll: Collection, query: str, q: np.ndarray, k: int, lexical_k: int | None = None) -> List[Tuple[int, float]]:
+    """Dense and BM25 candidate lists fused with reciprocal rank fusion; [(row, rrf score)] best first."""
+    dense_idx, _ = dense_recall(coll, q, k)
+    lexical = [i for i, _ in lexical_index(coll).search(query, lexical_k or k)]
+    fused = rrf([[int(i) for i in dense_idx], lexical], k=RAG_RRF_K)
+    return fused[:k]
+
+
+def _hit(coll: Collection, i: int, score: float) -> Dict[str, Any]:
+    row = coll.rows[i]
+    meta = row.get("metadata") or {}
+    return {
+        "id": row["id"],
+        "text": row.get("document") or "",
+        "title": meta.get("title") or meta.get("canonical_url") or "",
+        "canonical_url": meta.get("canonical_url") or "",
+        "doc_id": meta.get("doc_id"),
+        "chunk_index": meta.get("chunk_index"),
+        "heading_path": meta.get("heading_path") or "",
+        "dup_of": meta.get("dup_of") or "",
+        "source_path": meta.get("source_path"),
+        "score": float(score),
+    }
+
+
+_rerank_scores = LRU(RAG_RERANK_CACHE)
+
+
+def rerank_batch(
+    queries: List[str],
+    hit_lists: List[List[Dict[str, Any]]],
+    model_name: str = RAG_RERANKER_MODEL,
+    top_m: int = 0,
+    min_score: float | None = None,
+) -> Tuple[List[List[Dict[str, Any]]], Dict[str, Any]]:
+    """
+    Cross-encoder rerank of several (query, candidates) lists in one predict() call.
+    Scores are cached per (model, normalized query, chunk id), and pairs shared
+    between lists are scored once. Only the first top_m candidates of each list are
+    scored (0 = all); hits scoring below min_score are dropped.
+    Returns (reranked lists, {"pairs", "cached", "scored"}).
+    """
+    keyed: List[List[Tuple[Tuple[str, str, str], Dict[str, Any]]]] = []
+    todo: Dict[Tuple[str, str, str], Tuple[str, str]] = {}
+    cached = 0
+    scores: Dict[Tuple[str, str, str], float] = {}
+    for query, hits in zip(queries, hit_lists):
+        cand = hits[:top_m] if top_m > 0 else hits
+        nq = normalize_query(query)
+        row = []
+        for h in cand:
+            key = (model_name, nq, str(h["id"]))
+            row.append((key, h))
+            if key in scores or key in todo:
+                continue
+            hit = _rerank_scores.get(key)
+            if hit is None:
+                todo[key] = (query, h["text"])
+            else:
+                scores[key] = hit
+                cached += 1
+        keyed.append(row)
+
+    if todo:
+        pred = _model("rerank", model_name).predict(
+            list(todo.values()), batch_size=RAG_RERANK_BATCH, show_progress_bar=False
+        )
+        for key, sc in zip(todo, pred):
+            scores[key] = float(sc)
+            _rerank_scores.put(key, float(sc))
+
+    out: List[List[Dict[str, Any]]] = []
+    for row in keyed:
+        ranked = []
+        for key, h in row:
+            h["rerank_score"] = scores[key]
+            if min_score is None or h["rerank_score"] >= min_score:
+                ranked.append(h)
+        out.append(sorted(ranked, key=lambda h: -h["rerank_score"]))
+    return out, {"pairs": sum(len(r) for r in keyed), "cached": cached, "scored": len(todo)}
+
+
+def rerank_hits(query: str, hits: List[Dict[str, Any]], model_name: str = RAG_RERANKER_MODEL) -> List[Dict[str, Any]]:
+    if not hits:
+        return hits
+    return rerank_batch([query], [hits], model_name)[0][0]
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the query-embedding and rerank-score LRUs."""
+    return {"query": _query_vecs.stats(), "rerank": _rerank_scores.stats()}
+
+
+def build_citations(results: List[Dict[str, Any]]) -> Dict[str, Tuple[int, str]]:
+    """{canonical_url: (n, title)} numbered by first appearance."""
+    citations: Dict[str, Tuple[int, str]] = {}
+    for r in results:
+        url = r.get("canonical_url") or ""
+        if url and url not in citations:
+            citations[url] = (len(citations) + 1, r.get("title") or url)
+    return citations
+
+
+# --- rag_core-compatible API ---
+def collapse_duplicates(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep the best-ranked chunk of each near-duplicate group (dedup="link" collections)."""
+    seen = set()
+    out = []
+    for h in hits:
+        group = h.get("dup_of") or h["id"]
+        if group not in seen:
+            seen.add(group)
+            out.append(h)
+    return out
+
+
+def _recall(coll: Collection, query: str, q: np.ndarray, recall_k: int, hybrid: bool | None) -> List[Dict[str, Any]]:
+    if RAG_HYBRID if hybrid is None else hybrid:
+        return [_hit(coll, i, s) for i, s in hybrid_recall(coll, query, q, recall_k, RAG_LEXICAL_K or None)]
+    return [_hit(coll, int(i), s) for i, s in zip(*dense_recall(coll, q, recall_k))]
+
+
+def search(
+    query: str,
+    profile: str,
+    recall_k: int = 40,
+    rerank_k: int = 12,
+    context_k: int = 8,
+    rerank: bool = True,
+    hybrid: bool | None = None,
+) -> Dict[str, Any]:
+    """
+    Dense recall (ANN index if built, else exact dot product), fused with BM25
+    by RRF when hybrid (default RAG_HYBRID) -> optional cross-encoder rerank of
+    the recall set, keeping rerank_k -> first context_k become results.
+    Returns {"results": [...], "citations": {url: (n, title)}}.
+    """
+    return search_many([query], profile, recall_k, rerank_k, context_k, rerank, hybrid)[0]
+
+
+def search_many(
+    queries: List[str],
+    profile: str,
+    recall_k: int = 40,
+    rerank_k: int = 12,
+    context_k: int = 8,
+    rerank: bool = True,
+    hybrid: bool | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    search() for several queries against one profile: one batched query encode,
+    per-query recall, then one batched rerank over all (query, chunk) pairs.
+    Each output carries "timings" for the whole call (encode/recall/rerank ms, pair counts).
+    """
+    coll = load_collection(profile)
+    if not len(coll.rows):
+        return [{"results": [], "citations": {}} for _ in queries]
+    timings: Dict[str, Any] = {}
+
+    t0 = time.perf_counter()
+    with span("encode", "stage", queries=len(queries)):
+        qvecs = encode_queries(coll.model_name, list(queries))
+    t1 = time.perf_counter()
+    with span("recall", "stage", recall_k=recall_k) as rec:
+        recalled = [_recall(coll, query, q, recall_k, hybrid) for query, q in zip(queries, qvecs)]
+        rec["candidates"] = sum(len(r) for r in recalled)
+    t2 = time.perf_counter()
+    timings.update(encode_ms=(t1 - t0) * 1000, recall_ms=(t2 - t1) * 1000)
+
+    if rerank:
+        with span("rerank", "stage") as rec:
+            recalled, info = rerank_batch(queries, recalled, top_m=RAG_RERANK_TOP_M,
+                                          min_score=RAG_RERANK_MIN_SCORE)
+            rec.update(info)
+        timings.update(rerank_ms=(time.perf_counter() - t2) * 1000,
+                       rerank_pairs=info["pairs"], rerank_cached=info["cached"], rerank_scored=info["scored"])
+
+    outs = []
+    for hits in recalled:
+        results = collapse_duplicates(hits)[:rerank_k][:context_k]
+        outs.append({"results": results, "citations": build_citations(results), "timings": timings})
+    return outs
+
+
+def list_profiles(db_dir: str = RAG_DB_DIR, base: str = RAG_BASE) -> List[Dict[str, Any]]:
+    """[{"profile", "collection", "model_name", "count"}] for collections under base."""
+    import chromadb
+    client = chromadb.PersistentClient(path=db_dir)
+    prefix = f"{base}_"
+    out: List[Dict[str, Any]] = []
+    for c in client.list_collections():
+        name = c.name
+        if name == base:
+            profile = "_legacy"
+        elif name.startswith(prefix):
+            profile = name[len(prefix):]
+        else:
+            continue
+        man = read_manifest(db_dir, name)
+        out.append({
+            "profile": profile,
+            "collection": name,
+            "model_name": man.get("model_name", ""),
+            "count": man.get("count"),
+        })
+    out.sort(key=lambda p: p["profile"])
+    return out
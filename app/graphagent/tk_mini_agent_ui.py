@@ -17,7 +17,6 @@ if RAG_HOME and RAG_HOME not in sys.path:
 
 # Local imports from your repos
 from app.graphagent import rag_integration
-from rag_core import query_rag_system
 
 # Superscript helpers (for clickable ¹²³)
 SUP_MAP = str.maketrans("0123456789", "⁰¹²³⁴⁵⁶⁷⁸⁹")
@@ -184,7 +183,7 @@ class AgentUI(tk.Tk):
     # ---- Profile discovery ----
     def refresh_profiles(self):
         try:
-            profs = query_rag_system.list_profiles()
+            profs = rag_integration.list_profiles()
             choices = [p.get("profile") for p in profs]
             self.profile_cb["values"] = choices
             if choices and not self.profile_var.get():
@@ -259,8 +258,9 @@ class AgentUI(tk.Tk):
             env["RAG_UI_RERANK_K"]  = str(rerank_k)
             env["RAG_UI_CONTEXT_K"] = str(context_k)
             env["RAG_UI_RERANK"]    = "1" if use_rerank else "0"
-            # Request structured JSON from CLI
+            # Request structured JSON from CLI, streamed as NDJSON events (node/token/result)
             env["RAG_UI_JSON"] = "1"
+            env["RAG_UI_STREAM"] = "1"
             # Force UTF-8 to avoid Windows cp1252 crashes on emojis/special chars
             env["PYTHONIOENCODING"] = "utf-8"
 
@@ -275,15 +275,44 @@ class AgentUI(tk.Tk):
             env["PYTHONPATH"] = os.pathsep.join([p for p in (os.pathsep.join(extra_paths), existing_pp) if p])
 
             cmd = [sys.executable, "-m", "app.graphagent.cli", "--task", query]
-            proc = subprocess.run(
+            proc = subprocess.Popen(
                 cmd,
                 env=env,
                 cwd=str(repo_root),
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
                 encoding="utf-8",
                 errors="replace",
+                bufsize=1,
             )
+            # Drain stderr on the side so a chatty child can't block on a full pipe
+            err_chunks: List[str] = []
+            err_reader = threading.Thread(target=lambda: err_chunks.append(proc.stderr.read() or ""), daemon=True)
+            err_reader.start()
+
+            # Render tokens as they arrive; keep every line for the legacy/non-streaming fallbacks
+            data = None
+            out_lines: List[str] = []
+            for line in proc.stdout:
+                out_lines.append(line)
+                try:
+                    ev = json.loads(line)
+                except Exception:
+                    continue
+                if not isinstance(ev, dict):
+                    continue
+                kind = ev.get("event")
+                if kind == "token":
+                    self.after(0, self._on_stream_token, ev.get("node", ""), ev.get("text", ""))
+                elif kind == "node":
+                    self.after(0, self._on_stream_node, ev.get("node", ""))
+                elif kind == "result":
+                    data = ev
+            proc.wait()
+            err_reader.join(timeout=5)
+            stdout = "".join(out_lines)
+            stderr = "".join(err_chunks)
 
             if proc.returncode != 0:
                 ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -293,8 +322,8 @@ class AgentUI(tk.Tk):
                     f.write("CWD: " + str(repo_root) + "\n")
                     f.write("RAG_HOME: " + str(rag_home) + "\n")
                     f.write("PYTHONPATH: " + env["PYTHONPATH"] + "\n\n")
-                    f.write("---- STDOUT ----\n" + (proc.stdout or "") + "\n\n")
-                    f.write("---- STDERR ----\n" + (proc.stderr or "") + "\n")
+                    f.write("---- STDOUT ----\n" + stdout + "\n\n")
+                    f.write("---- STDERR ----\n" + stderr + "\n")
                 try:
                     os.startfile(str(log_path))
                 except Exception:
@@ -307,15 +336,15 @@ class AgentUI(tk.Tk):
             self._last_evidence_list = []
             self._last_scratch_list = []
             try:
-                data = json.loads(proc.stdout)
+                if data is None:
+                    data = json.loads(stdout)  # CLI without streaming: one JSON object
                 answer_text = data.get("result", "") or ""
                 self._last_graph_text = data.get("graph", "") or ""
                 self._last_evidence_list = data.get("evidence", []) or []
                 self._last_scratch_list = data.get("scratch", []) or []
             except Exception:
                 # Legacy fallback
-                stdout = (proc.stdout or "").strip()
-                answer_text = self._pick_answer_from_stdout(stdout)
+                answer_text = self._pick_answer_from_stdout(stdout.strip())
                 # Optional: you could parse legacy graph/evidence/scratch here if needed
 
         except Exception as e:
@@ -326,6 +355,19 @@ class AgentUI(tk.Tk):
         # 3) Update UI
         self.after(0, lambda: self._update_ui(answer_text, ctx, citations))
 
+    # ---- Streaming (called on the Tk thread via after()) ----
+    def _on_stream_node(self, node: str):
+        self.status_var.set(f"Running agent… ({node})")
+        if node == "write":
+            self.answer_txt.delete("1.0", "end")
+
+    def _on_stream_token(self, node: str, text: str):
+        # Draft tokens go straight into the Answer tab; the critic's revision
+        # (if any) replaces them when the final result arrives.
+        if node == "write":
+            self.answer_txt.insert("end", text)
+            self.answer_txt.see("end")
+
     # Try to grab the last non-empty block from CLI output as the final answer
     def _pick_answer_from_stdout(self, s: str) -> str:
         if not s:
@@ -1,7 +1,7 @@
 # app/graphagent/tk_mini_ui.py
 from __future__ import annotations
-import os, sys, threading, webbrowser, traceback, re
-from typing import Dict, Any, List, Tuple
+import os, sys, threading, webbrowser, traceback, re, json
+from typing import Dict, Any, Iterator, List, Tuple
 
 # Ensure external rag_core is importable
 RAG_HOME = os.environ.get("RAG_HOME", r"C:\Users\gmoores\Desktop\AI\RAG")
@@ -13,7 +13,6 @@ from tkinter import ttk, messagebox
 
 import requests
 from app.graphagent import rag_integration
-from rag_core import query_rag_system
 
 # ------- LLM endpoint (OpenAI-compatible local server) -------
 LLM_ENDPOINT = "http://127.0.0.1:1234/v1/chat/completions"
@@ -65,6 +64,33 @@ def llm_answer(prompt: str, system: str = "You are a helpful assistant.") -> str
     data = r.json()
     return data["choices"][0]["message"]["content"].strip()
 
+def llm_answer_stream(prompt: str, system: str = "You are a helpful assistant.") -> Iterator[str]:
+    """Same request as llm_answer with stream=True; yields content deltas from the SSE stream."""
+    payload = {
+        "model": MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.3,
+        "stream": True,
+    }
+    with requests.post(LLM_ENDPOINT, json=payload, timeout=120, stream=True) as r:
+        r.raise_for_status()
+        for raw in r.iter_lines(decode_unicode=True):
+            if not raw or not raw.startswith("data:"):
+                continue
+            data = raw[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                choice = (json.loads(data).get("choices") or [{}])[0]
+            except ValueError:
+                continue
+            delta = (choice.get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
 def assemble_prompt(query: str, ctx: List[Dict[str, Any]], citations: Dict[str, Tuple[int, str]]) -> str:
     """
     We now ask the model to use inline [n] markers, and NOT to print a Sources section.
@@ -188,7 +214,7 @@ class App(tk.Tk):
     # --------------------- Profile discovery ---------------------
     def refresh_profiles(self):
         try:
-            profs = query_rag_system.list_profiles()
+            profs = rag_integration.list_profiles()
             choices = [p.get("profile") for p in profs]
             self.profile_cb["values"] = choices
             if choices and not self.profile_var.get():
@@ -238,8 +264,14 @@ class App(tk.Tk):
         self._last_citations = citations
 
         prompt = assemble_prompt(query, ctx, citations)
+        self.after(0, lambda: self.answer_txt.delete("1.0", "end"))
         try:
-            raw_answer = llm_answer(prompt)
+            # Show raw tokens as they arrive; the cleaned answer replaces them below
+            parts: List[str] = []
+            for delta in llm_answer_stream(prompt):
+                parts.append(delta)
+                self.after(0, self._append_stream_text, delta)
+            raw_answer = "".join(parts).strip()
         except Exception as e:
             tb = traceback.format_exc()
             self._ui_error(f"LLM error (check 127.0.0.1:1234):\n{e}\n\n{tb}")
@@ -305,6 +337,10 @@ class App(tk.Tk):
 
         self.after(0, update_ui)
 
+    def _append_stream_text(self, text: str):
+        self.answer_txt.insert("end", text)
+        self.answer_txt.see("end")
+
     # --------------------- Inline superscript tagging ---------------------
     def _build_num_to_url(self) -> Dict[int, str]:
         num_to_url: Dict[int, str] = {}
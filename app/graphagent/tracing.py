@@ -0,0 +1,119 @@
+# app/graphagent/tracing.py
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List
+
+
+class Tracer:
+    """
+    Collects spans for one run. A span is a flat dict:
+      {"id", "parent", "name", "kind", "start_ms", "dur_ms", "thread", ...attrs}
+    kind is "node", "llm", "retrieval" or "stage" (a step inside a retrieval call:
+    encode/recall/rerank); attrs carry tokens, cache hits, errors.
+    """
+
+    def __init__(self, run_id: str | None = None):
+        self.run_id = run_id
+        self.spans: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    def next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def record(self, rec: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(rec)
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-node wall time plus LLM/retrieval totals (the hot-path view)."""
+        nodes: Dict[str, Dict[str, float]] = {}
+        llm = {"calls": 0, "ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cache_hits": 0}
+        retrieval: Dict[str, Any] = {"calls": 0, "ms": 0.0, "stages": {}}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            if s["kind"] == "node":
+                n = nodes.setdefault(s["name"], {"calls": 0, "ms": 0.0})
+                n["calls"] += 1
+                n["ms"] += s["dur_ms"]
+            elif s["kind"] == "llm":
+                llm["calls"] += 1
+                llm["ms"] += s["dur_ms"]
+                llm["prompt_tokens"] += int(s.get("prompt_tokens") or 0)
+                llm["completion_tokens"] += int(s.get("completion_tokens") or 0)
+                llm["cache_hits"] += 1 if s.get("cached") else 0
+            elif s["kind"] == "retrieval":
+                retrieval["calls"] += 1
+                retrieval["ms"] += s["dur_ms"]
+            elif s["kind"] == "stage":
+                st = retrieval["stages"].setdefault(s["name"], {"calls": 0, "ms": 0.0})
+                st["calls"] += 1
+                st["ms"] += s["dur_ms"]
+        return {"nodes": nodes, "llm": llm, "retrieval": retrieval}
+
+    def export_jsonl(self, path: str) -> None:
+        """Append every span (tagged with run_id) to a JSONL trace file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        with open(path, "a", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(dict(s, run_id=self.run_id), ensure_ascii=False) + "\n")
+
+
+_tracer: ContextVar[Tracer | None] = ContextVar("tracer", default=None)
+_parent: ContextVar[int | None] = ContextVar("trace_parent", default=None)
+
+
+@contextmanager
+def tracing(tracer: Tracer | None):
+    """Make tracer the active one for spans opened in this context (and copies of it)."""
+    tok = _tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _tracer.reset(tok)
+
+
+@contextmanager
+def span(name: str, kind: str, **attrs) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block under the active tracer. Yields the span dict so callers can
+    attach attributes (tokens, cache hits). Without an active tracer this is a
+    no-op that still yields a scratch dict.
+    """
+    tracer = _tracer.get()
+    rec: Dict[str, Any] = dict(attrs)
+    if tracer is None:
+        yield rec
+        return
+    sid = tracer.next_id()
+    tok = _parent.set(sid)
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except BaseException as e:
+        rec["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _parent.reset(tok)
+        rec.update(
+            id=sid,
+            parent=_parent.get(),
+            name=name,
+            kind=kind,
+            start_ms=round((t0 - tracer._t0) * 1000, 2),
+            dur_ms=round((time.perf_counter() - t0) * 1000, 2),
+            thread=threading.current_thread().name,
+        )
+        tracer.record(rec)
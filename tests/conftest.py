@@ -0,0 +1,5 @@
+# The agent modules pick their retrieval backend at import time; tests use the
+# in-process one (the external rag_core checkout is not on the test path).
+import os
+
+os.environ.setdefault("RAG_BACKEND", "builtin")
@@ -0,0 +1,93 @@
+# staged_ingest with dedup="drop": a duplicate dropped onto a surviving chunk must come
+# back when that survivor's file is edited or removed.
+import numpy as np
+
+from app.graphagent.file_index import FileIndex
+from app.graphagent.ingest import staged_ingest
+
+BOILERPLATE = ("Thanks for reading this post. Subscribe to the newsletter for weekly updates "
+               "on retrieval, ranking and evaluation, and share it with a friend who might enjoy it.")
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        self.docs.update(zip(ids, documents))
+
+    def delete(self, ids):
+        for i in ids:
+            self.docs.pop(i, None)
+
+
+class FakeModel:
+    def encode(self, texts, **kw):
+        return np.zeros((len(texts), 4), dtype=np.float32)
+
+
+def _ingest(files, coll, findex):
+    events = list(staged_ingest([str(p) for p in files], coll, findex, FakeModel(), "fake", 2000, 0.0, {},
+                                known=findex.all(), workers=0, dedup="drop"))
+    return events[-1]["counts"]
+
+
+def _boilerplate_copies(coll):
+    return sorted(cid for cid, doc in coll.docs.items() if "Subscribe to the newsletter" in doc)
+
+
+def test_dropped_duplicates_reappear_when_survivor_goes(tmp_path):
+    a, b = tmp_path / "a.md", tmp_path / "b.md"
+    a.write_text(BOILERPLATE, encoding="utf-8")
+    b.write_text(BOILERPLATE, encoding="utf-8")
+    coll, findex = FakeCollection(), FileIndex(str(tmp_path / "files.sqlite"))
+    try:
+        counts = _ingest([a, b], coll, findex)
+        assert counts["duplicates"] == 1
+        assert len(_boilerplate_copies(coll)) == 1
+        survivor = _boilerplate_copies(coll)[0]
+
+        # edit the survivor's file: b's dropped copy must be written again
+        a.write_text("A completely different post about vector quantization and recall budgets.", encoding="utf-8")
+        counts = _ingest([a, b], coll, findex)
+        assert counts["orphans"] == 1
+        copies = _boilerplate_copies(coll)
+        assert len(copies) == 1 and copies != [survivor]
+        assert all(not dup_of for dup_of in (d for _, d in findex.fingerprints().values()))
+
+        # and when b's chunk is the survivor and b is removed, a later copy comes back too
+        c = tmp_path / "c.md"
+        c.write_text(BOILERPLATE, encoding="utf-8")
+        counts = _ingest([a, b, c], coll, findex)
+        assert counts["duplicates"] == 1 and len(_boilerplate_copies(coll)) == 1
+        counts = _ingest([a, c], coll, findex)
+        assert counts["orphans"] == 1
+        assert len(_boilerplate_copies(coll)) == 1
+        assert findex.duplicate_summary()["duplicates"] == 0
+    finally:
+        findex.close()
+
+
+def test_simhash_index_matches_brute_force():
+    import random
+    from app.graphagent.dedup import SimHashIndex
+
+    rng = random.Random(0)
+    for max_distance in (0, 3, 6):
+        idx, fps = SimHashIndex(max_distance), {}
+        for i in range(1500):
+            fp = rng.getrandbits(64)
+            if fps and i % 3 == 0:  # a near copy of an indexed fingerprint
+                fp = rng.choice(list(fps.values()))
+                for bit in rng.sample(range(64), rng.randint(0, 8)):
+                    fp ^= 1 << bit
+            dists = [(bin(v ^ fp).count("1"), c) for c, v in fps.items()]
+            expected = min((d for d in dists if d[0] <= max_distance), default=(0, None))[1]
+            assert idx.find(fp) == expected
+            if expected is None:
+                idx.add(f"c{i:05d}", fp)
+                fps[f"c{i:05d}"] = fp
+            if i % 40 == 0:
+                cid = rng.choice(sorted(fps))
+                idx.remove(cid)
+                del fps[cid]
@@ -0,0 +1,33 @@
+# ANN / quantization recall evaluation on collections smaller than the usual knobs.
+import numpy as np
+
+from app.graphagent.ann_index import IVFIndex
+
+
+def _vectors(n, dim=16, seed=0):
+    v = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_ivf_nlist_clamped_to_training_rows():
+    vectors = _vectors(30)
+    index, stats = IVFIndex.build(vectors, nlist=100)
+    assert stats["nlist"] == 30
+    index.apply({"nprobe": 30})
+    assert sorted(index.search(vectors, vectors[0], 5)[0].tolist()) == sorted(
+        np.argsort(-(vectors @ vectors[0]))[:5].tolist())
+
+
+def test_recall_is_exact_when_collection_smaller_than_k(tmp_path):
+    from app.graphagent.ann_index import recall_report
+    from app.graphagent.quant import QuantizedVectors, quant_report, quantize_export
+
+    vectors = _vectors(12)  # n < k: every query's true set is all 12 rows
+    index, _ = IVFIndex.build(vectors, nlist=8)
+    report = recall_report(index, vectors, k=40, queries=5)
+    assert report["settings"][-1] == dict(report["settings"][-1], nprobe=8, recall=1.0)  # every list probed
+
+    quantize_export(str(tmp_path), vectors)
+    qv = QuantizedVectors.load(str(tmp_path), vectors)
+    for row in quant_report(qv, k=40, queries=5)["settings"]:
+        assert row["recall"] == 1.0 and row["recall_delta"] == 0.0
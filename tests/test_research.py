@@ -0,0 +1,75 @@
+# node_research must build the same evidence whether the backend serves the queries
+# in one batched call (search_docs_many) or one at a time (search_docs).
+import time
+
+from app.graphagent import core
+
+QUERIES = ["alpha query", "beta query", "gamma query"]
+
+
+def _hits(q):
+    # overlapping urls across queries so the dedup order matters
+    words = q.split()
+    return [{"canonical_url": f"https://ex/{w}", "title": w.upper(), "text": f"{q} on {w}"}
+            for w in words + ["shared"]]
+
+
+def _search(query, profile="", recall_k=0, rerank_k=0, context_k=0, rerank=True):
+    return {"results": _hits(query)}
+
+
+def _search_many(queries, profile="", recall_k=0, rerank_k=0, context_k=0, rerank=True):
+    return [_search(q) for q in queries]
+
+
+def _run(monkeypatch, batch, search_many=_search_many, workers="4", timeout="60"):
+    monkeypatch.setattr(core, "call_llm", lambda prompt, cache=False: '["%s"]' % '", "'.join(QUERIES))
+    monkeypatch.setattr(core, "BATCH_SEARCH", batch)
+    monkeypatch.setattr(core, "search_docs", _search)
+    monkeypatch.setattr(core, "search_docs_many", search_many)
+    monkeypatch.setenv("RAG_UI_WORKERS", workers)
+    monkeypatch.setenv("RAG_UI_QUERY_TIMEOUT", timeout)
+    state = core.State(task="the task")
+    core.node_research(state)
+    return state
+
+
+def _sequential_lines():
+    ctx = []
+    for q in QUERIES + ["the task"]:  # baseline last
+        ctx.extend(_hits(q))
+    lines, seen = [], set()
+    for c in ctx:
+        if c["canonical_url"] in seen:
+            continue
+        seen.add(c["canonical_url"])
+        lines.append(f"{c['title']} — {c['canonical_url']} :: {c['text']}")
+    return lines[:12]
+
+
+def test_batched_evidence_matches_sequential(monkeypatch):
+    expected = _sequential_lines()
+    for workers in ("1", "4"):
+        assert _run(monkeypatch, batch=False, workers=workers).evidence == expected
+        assert _run(monkeypatch, batch=True, workers=workers).evidence == expected
+
+
+def test_batch_error_falls_back_per_query(monkeypatch):
+    def broken(*a, **kw):
+        raise RuntimeError("boom")
+
+    state = _run(monkeypatch, batch=True, search_many=broken)
+    assert state.evidence == _sequential_lines()
+    assert any(s.startswith("RESEARCH-BATCH-ERROR") for s in state.scratch)
+
+
+def test_batch_respects_query_timeout(monkeypatch):
+    def slow(*a, **kw):
+        time.sleep(1.0)
+        return _search_many(*a, **kw)
+
+    t0 = time.monotonic()
+    state = _run(monkeypatch, batch=True, search_many=slow, timeout="0.05")
+    assert time.monotonic() - t0 < 0.9
+    assert state.evidence == []
+    assert sum(s.startswith("RESEARCH-TIMEOUT") for s in state.scratch) == len(QUERIES) + 1
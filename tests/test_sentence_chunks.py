@@ -0,0 +1,28 @@
+# Golden comparison of ingest.sentence_chunks / pack_sentences against the
+# pre-rewrite implementation frozen in chunk_bench (same cases the benchmark checks).
+import random
+
+from app.graphagent.chunk_bench import GOLDEN_SETTINGS, _reference_pack, golden_mismatches, synthetic_doc
+from app.graphagent.ingest import pack_sentences
+
+
+def test_matches_reference_on_golden_cases():
+    rng = random.Random(0)
+    docs = [synthetic_doc(rng, 64 * 1024) for _ in range(20)]
+    checked, bad = golden_mismatches(docs, seed=0)
+    assert checked == 660
+    assert bad == []
+
+
+def test_edge_cases():
+    cases = [
+        [],
+        ["", " ", "\n"],
+        ["x" * 900],
+        ["line\n", "next", "  padded  "],
+        ["a" * 10, "b" * 900, "c" * 10],
+    ]
+    for sents in cases:
+        for chunk_size, overlap in GOLDEN_SETTINGS:
+            oc = int(chunk_size * overlap)
+            assert pack_sentences(sents, chunk_size, oc) == _reference_pack(sents, chunk_size, oc)